@@ -0,0 +1,89 @@
+import functools
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+from json_cache import CACHE_DIR, load_json_cache, save_json_cache
+
+
+# Canonicalization rules, as (regex, replacement) pairs applied in order after
+# lower-casing and stripping. "post" is what db/preprocess applies to every
+# state; the other rule sets belong to individual state importers
+AGENCY_RULES = {
+    "post": [
+        (r"office office$", "office"),
+        (r"\bso$", "sheriff's office"),
+        (r"\bpd$", "police department"),
+    ],
+    "mn": [
+        (r"dept\.?", "department"),
+        (r"\bco\.", "county"),
+    ],
+}
+
+
+class AgencyNameCanonicalizer:
+    """Canonicalizes agency names with one rule set. Each distinct name is
+    run through the compiled rules once; the raw -> canonical mappings are
+    kept in a json cache that is shared across runs and states, and is
+    thrown away whenever the rules change
+    """
+
+    def __init__(self, rule_set="post", cache_dir=CACHE_DIR):
+        rules = AGENCY_RULES[rule_set]
+        self.rules = [
+            (re.compile(pattern), replacement) for pattern, replacement in rules
+        ]
+        self.rules_hash = hashlib.sha256(
+            json.dumps(rules).encode("utf-8")
+        ).hexdigest()
+        self.cache_path = (
+            os.path.join(cache_dir, f"agency-names-{rule_set}.json")
+            if cache_dir
+            else None
+        )
+        self.cache = load_json_cache(
+            self.cache_path, "rules_hash", self.rules_hash
+        )
+
+    def canonicalize(self, name):
+        name = name.lower().strip()
+        for pattern, replacement in self.rules:
+            name = pattern.sub(replacement, name)
+        return name
+
+    def __call__(self, names):
+        """Canonicalize a Series of names. Like the pandas .str methods,
+        anything that isn't a string comes back as NaN"""
+        codes, uniques = pd.factorize(names)
+        added = False
+        canonical = np.empty(len(uniques), dtype=object)
+        for i, name in enumerate(uniques):
+            if not isinstance(name, str):
+                canonical[i] = np.nan
+                continue
+            if name not in self.cache:
+                self.cache[name] = self.canonicalize(name)
+                added = True
+            canonical[i] = self.cache[name]
+        if added:
+            save_json_cache(
+                self.cache_path, "rules_hash", self.rules_hash, self.cache
+            )
+
+        out = np.asarray(names, dtype=object).copy()
+        present = codes >= 0
+        out[present] = canonical[codes[present]]
+        return pd.Series(out, index=names.index, name=names.name)
+
+
+@functools.lru_cache(maxsize=None)
+def get_canonicalizer(rule_set="post"):
+    return AgencyNameCanonicalizer(rule_set)
+
+
+def canonicalize_agency_names(names, rule_set="post"):
+    return get_canonicalizer(rule_set)(names)
@@ -0,0 +1,125 @@
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+
+# Collection holding one manifest document per uploaded collection
+MANIFEST_COLLECTION = "manifests"
+
+UPLOADING = "uploading"
+DIFFING = "diffing"
+COMPLETE = "complete"
+
+
+class DatasetManifest:
+    """What has been uploaded to a collection, kept in Firestore as a single
+    document with one field per state:
+
+        {"status": "uploading" | "diffing" | "complete", "rows": ...,
+         "sha256": ..., "file": ..., "uploaded_at": ...}
+
+    A state stays "uploading" from the first batch until its last one lands,
+    so a state left in that status was only partly uploaded. A state left
+    "diffing" had a differential upload interrupted, which is finished by
+    diffing again against the same snapshot. The document
+    is read once up front; changes are written through as they happen.
+    """
+
+    def __init__(self, storage, collection):
+        self.storage = storage
+        self.collection = collection
+        self.states = None
+
+    def load(self):
+        """Read the manifest. Returns False if it doesn't exist yet"""
+        states = self.storage.get(MANIFEST_COLLECTION, self.collection)
+        self.states = states or {}
+        return states is not None
+
+    def get(self, state_name):
+        return self.states.get(state_name)
+
+    def status(self, state_name):
+        entry = self.get(state_name)
+        return entry["status"] if entry else None
+
+    @retry(
+        stop=stop_after_attempt(10),
+        wait=wait_exponential(multiplier=1, min=1, max=30),
+        retry=retry_if_exception_type((ResourceExhausted, DeadlineExceeded)),
+    )
+    def save(self):
+        batch = self.storage.batch()
+        batch.set(MANIFEST_COLLECTION, self.collection, self.states)
+        batch.commit()
+
+    def _write(self, state_name, entry):
+        self.states[state_name] = entry
+        self.save()
+
+    def mark_uploading(self, state_name, file_path, file_hash):
+        self._write(
+            state_name,
+            {
+                "status": UPLOADING,
+                "rows": None,
+                "sha256": file_hash,
+                "file": file_path,
+                "uploaded_at": None,
+            },
+        )
+
+    def mark_diffing(self, state_name, file_path, file_hash):
+        self._write(
+            state_name,
+            {
+                "status": DIFFING,
+                "rows": None,
+                "sha256": file_hash,
+                "file": file_path,
+                "uploaded_at": None,
+            },
+        )
+
+    def mark_complete(self, state_name, file_path, file_hash, rows):
+        self._write(
+            state_name,
+            {
+                "status": COMPLETE,
+                "rows": rows,
+                "sha256": file_hash,
+                "file": file_path,
+                "uploaded_at": datetime.now(timezone.utc).isoformat(),
+            },
+        )
+
+    def mark_legacy(self, state_name):
+        """Record a state uploaded before there was a manifest"""
+        self._write(
+            state_name,
+            {
+                "status": COMPLETE,
+                "rows": None,
+                "sha256": None,
+                "file": None,
+                "uploaded_at": None,
+            },
+        )
+
+    def remove(self, state_name):
+        if self.states is None:
+            self.load()
+        if self.states.pop(state_name, None) is not None:
+            self.save()
+
+    def clear(self):
+        self.states = {}
+        batch = self.storage.batch()
+        batch.delete(MANIFEST_COLLECTION, self.collection)
+        batch.commit()
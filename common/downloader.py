@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+from file_hash import CHUNK_SIZE, sha256_file
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+STATUSES = ["new", "changed", "unchanged", "failed"]
+
+
+def make_session(pool_size=8):
+    """A session whose connection pool is big enough for every worker, and
+    which retries connection errors and 5xx responses"""
+    session = requests.Session()
+    retries = Retry(
+        total=5,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class DownloadCache:
+    """What was last downloaded from each URL: its ETag and Last-Modified,
+    so the next request can be conditional, the size and sha256 of the
+    bytes, and the size of the file they were saved as, so a file that was
+    deleted or replaced by hand isn't mistaken for the cached one"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def get(self, url, file_path):
+        """The entry for `url`, or None if there isn't one or the file it
+        was saved to is gone or has changed size"""
+        entry = self.entries.get(url)
+        if entry is None or entry.get("file") != file_path:
+            return None
+        if not os.path.exists(file_path):
+            return None
+        if os.path.getsize(file_path) != entry.get("file_size"):
+            return None
+        return entry
+
+    def update(self, url, entry):
+        # written after every file, so an interrupted run keeps what it got
+        with self.lock:
+            self.entries[url] = entry
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+def conditional_headers(entry):
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def download_file(session, url, file_path, headers=None, timeout=60):
+    """Stream a URL to disk without holding it in memory. The bytes go to a
+    temp file next to the target, which only replaces it once complete, so
+    an interrupted download never leaves a partial file behind.
+
+    Returns None if the server answered 304 Not Modified to the
+    conditional `headers`, otherwise the size, sha256, ETag and
+    Last-Modified of what was written"""
+    tmp_path = f"{file_path}.{os.getpid()}.part"
+    written = 0
+    digest = hashlib.sha256()
+    try:
+        with session.get(
+            url, headers=headers, stream=True, timeout=timeout
+        ) as response:
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    written += len(chunk)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {
+        "size": written,
+        "sha256": digest.hexdigest(),
+        "etag": etag,
+        "last_modified": last_modified,
+    }
+
+
+def validate_csv(file_path, chunk_rows=500_000):
+    """Check a downloaded file parses as csv, a chunk at a time. Returns the
+    number of rows"""
+    rows = 0
+    for chunk in pd.read_csv(file_path, dtype=str, chunksize=chunk_rows):
+        rows += len(chunk)
+    return rows
+
+
+def download_states(
+    state_links,
+    path_for_state,
+    cache_path,
+    workers=4,
+    validate=False,
+    convert=None,
+    force=False,
+):
+    """Bring every state's file up to date, `workers` at a time over one
+    pooled session. `path_for_state(state)` gives where each file goes;
+    `convert(downloaded_path, file_path)`, if given, turns the downloaded
+    csv into the final file.
+
+    A file downloaded before, per the DownloadCache at `cache_path`, is only
+    fetched again if the server says it has changed, so an unchanged file
+    costs one round trip; when the server sends neither an ETag nor a
+    Last-Modified, the new bytes are compared against the cached sha256
+    instead. `force` skips the conditional request. Returns {state:
+    status}, where status is "new", "changed", "unchanged" or "failed"
+    """
+    session = make_session(workers)
+    cache = DownloadCache(cache_path)
+    results = {}
+
+    def fetch(state, url, file_path):
+        start = time.time()
+        existed = os.path.exists(file_path)
+        entry = cache.get(url, file_path)
+        previous_sha256 = entry["sha256"] if entry else None
+        if entry is None and existed and convert is None:
+            # a file from before there was a cache: keep it if the server
+            # still has the same bytes
+            previous_sha256 = sha256_file(file_path)
+        headers = {} if force or entry is None else conditional_headers(entry)
+
+        # the final file only appears once it has passed validation
+        staged_path = file_path + ".download"
+        try:
+            downloaded = download_file(session, url, staged_path, headers)
+            if downloaded is None:
+                return "unchanged", 0, time.time() - start
+            if downloaded["sha256"] == previous_sha256:
+                status = "unchanged"
+            else:
+                status = "changed" if existed else "new"
+            if status != "unchanged" or force:
+                if validate:
+                    rows = validate_csv(staged_path)
+                    print(f"Validated {state}: {rows} rows")
+                if convert is None:
+                    os.replace(staged_path, file_path)
+                else:
+                    convert(staged_path, file_path)
+        finally:
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+        cache.update(
+            url,
+            {
+                **downloaded,
+                "file": file_path,
+                "file_size": os.path.getsize(file_path),
+            },
+        )
+        return status, downloaded["size"], time.time() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for state, url in state_links.items():
+            file_path = path_for_state(state)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            futures[pool.submit(fetch, state, url, file_path)] = (
+                state,
+                file_path,
+            )
+        for future in as_completed(futures):
+            state, file_path = futures[future]
+            try:
+                status, size, seconds = future.result()
+            except Exception as e:
+                print(f"Error downloading {state}: {str(e)}")
+                results[state] = "failed"
+                continue
+            if status == "unchanged":
+                print(f"{file_path} is up to date ({seconds:.1f} seconds)")
+            else:
+                print(
+                    f"Saved {state} data to {file_path} "
+                    f"({size / 2**20:.1f} MB in {seconds:.1f} seconds)"
+                )
+            results[state] = status
+
+    session.close()
+    return results
+
+
+def write_report(results, report_path):
+    """Which states changed in this run, for later stages to limit their
+    work to"""
+    report = {
+        status: sorted(s for s, result in results.items() if result == status)
+        for status in STATUSES
+    }
+    # new files need processing as much as changed ones
+    report["updated"] = sorted(report["new"] + report["changed"])
+    tmp_path = report_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, report_path)
+    print(f"\nWrote the list of updated states to {report_path}")
+
+
+def print_summary(results):
+    print("\nDownload Summary:")
+    for status in STATUSES:
+        states = sorted(s for s, result in results.items() if result == status)
+        print(f"{status.capitalize()}: {len(states)} states")
+        if status != "unchanged" and states:
+            for state in states:
+                print(f"  - {state}")
@@ -0,0 +1,14 @@
+import hashlib
+
+
+CHUNK_SIZE = 1 << 20
+
+
+def sha256_file(file_path, chunk_size=CHUNK_SIZE):
+    """sha256 of a file's contents, read in chunks so big files never sit
+    in memory"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
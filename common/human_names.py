@@ -0,0 +1,96 @@
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import nameparser
+import numpy as np
+import pandas as pd
+from json_cache import CACHE_DIR, load_json_cache, save_json_cache
+
+
+# The parts of a HumanName kept, in the order split_name returns them
+NAME_PARTS = ["first", "middle", "last", "suffix"]
+
+# Parsing fewer uncached names than this in a process pool costs more in
+# start-up than it saves
+MIN_POOL_NAMES = 50_000
+
+
+def split_name(name):
+    parsed = nameparser.HumanName(name)
+    return [getattr(parsed, part) for part in NAME_PARTS]
+
+
+def split_names(names):
+    return [split_name(name) for name in names]
+
+
+class HumanNameSplitter:
+    """Splits full names into their parts with nameparser. Each distinct
+    name is parsed once and only its parts are kept, never the HumanName
+    objects; the raw -> parts mappings are kept in a json cache that is
+    shared across runs and states, and is thrown away whenever the
+    nameparser version changes
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.version = nameparser.__version__
+        self.cache_path = (
+            os.path.join(cache_dir, "human-names.json") if cache_dir else None
+        )
+        self.cache = load_json_cache(
+            self.cache_path, "nameparser_version", self.version
+        )
+
+    def parse_uncached(self, names, workers=1):
+        if workers > 1 and len(names) >= MIN_POOL_NAMES:
+            chunks = np.array_split(np.asarray(names, dtype=object), workers)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = [
+                    split
+                    for chunk in pool.map(split_names, chunks)
+                    for split in chunk
+                ]
+        else:
+            parts = split_names(names)
+        self.cache.update(zip(names, parts, strict=True))
+
+    def __call__(self, names, workers=1):
+        """Split a Series of full names into a frame of first, middle,
+        last, suffix and middle_initial columns. Anything that isn't a
+        string gets NaN in every column. Names not in the cache are parsed
+        in a pool of `workers` processes if there are enough of them"""
+        codes, uniques = pd.factorize(names)
+        uncached = [
+            name
+            for name in uniques
+            if isinstance(name, str) and name not in self.cache
+        ]
+        if uncached:
+            self.parse_uncached(uncached, workers)
+            save_json_cache(
+                self.cache_path, "nameparser_version", self.version, self.cache
+            )
+
+        empty = [np.nan] * len(NAME_PARTS)
+        parts = np.array(
+            [
+                self.cache[name] if isinstance(name, str) else empty
+                for name in uniques
+            ]
+            + [empty],
+            dtype=object,
+        ).reshape(-1, len(NAME_PARTS))
+        # missing names have code -1, which picks the empty row at the end
+        out = pd.DataFrame(parts[codes], columns=NAME_PARTS, index=names.index)
+        out["middle_initial"] = out.middle.str[:1]
+        return out
+
+
+@functools.lru_cache(maxsize=None)
+def get_splitter():
+    return HumanNameSplitter()
+
+
+def split_human_names(names, workers=1):
+    return get_splitter()(names, workers)
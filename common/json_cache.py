@@ -0,0 +1,38 @@
+import json
+import os
+
+
+# Where the caches shared across runs and states are kept
+CACHE_DIR = os.environ.get(
+    "US_POST_DATA_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "us-post-data"),
+)
+
+
+def load_json_cache(cache_path, version_key, version):
+    """The entries of a json cache file, or {} if there is no cache path,
+    the file is missing or unreadable, or it was written for a different
+    `version` (kept under `version_key`)"""
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cached.get(version_key) != version:
+        return {}
+    return cached.get("names", {})
+
+
+def save_json_cache(cache_path, version_key, version, entries):
+    """Write the entries of a json cache through a temp file, which replaces
+    the cache once complete"""
+    if not cache_path:
+        return
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    # several workers can save at once, so each writes its own temp file
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({version_key: version, "names": entries}, f)
+    os.replace(tmp_path, cache_path)
@@ -0,0 +1,111 @@
+import threading
+import time
+
+
+class RateController:
+    """AIMD-style write rate controller for Firestore.
+
+    Writes are paced to `rate` operations per second. While commits succeed
+    the rate ramps up following Firestore's 500/50/5 guidance: start at 500
+    ops/second and grow by at most 50% every 5 minutes (linearly within each
+    window). A quota error, deadline or a commit latency well above the best
+    seen so far cuts the rate multiplicatively and restarts the ramp.
+
+    Safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        initial_rate=500,
+        max_rate=10_000,
+        min_rate=10,
+        ramp_interval=300,
+        ramp_factor=0.5,
+        backoff_factor=0.5,
+        latency_factor=2.0,
+        cooldown=5,
+    ):
+        self.rate = float(initial_rate)
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min_rate)
+        self.ramp_interval = ramp_interval
+        self.ramp_factor = ramp_factor
+        self.backoff_factor = backoff_factor
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.retries = 0
+        self.backoffs = 0
+        self.latency = None
+        self.best_latency = None
+        self.lock = threading.Lock()
+        now = time.monotonic()
+        self.next_free = now
+        self.window_start = now
+        self.window_rate = self.rate
+        self.last_backoff = float("-inf")
+
+    def acquire(self, ops):
+        """Block until `ops` writes can go out at the current rate"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_free)
+            self.next_free = start + ops / self.rate
+        delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def record_success(self, latency):
+        with self.lock:
+            now = time.monotonic()
+            self.latency = (
+                latency
+                if self.latency is None
+                else 0.8 * self.latency + 0.2 * latency
+            )
+            if self.best_latency is None or self.latency < self.best_latency:
+                self.best_latency = self.latency
+            if self.latency > self.latency_factor * self.best_latency:
+                self._back_off(now)
+                return
+            elapsed = now - self.window_start
+            if elapsed >= self.ramp_interval:
+                self.window_rate = min(
+                    self.max_rate, self.window_rate * (1 + self.ramp_factor)
+                )
+                self.window_start = now
+                elapsed = 0
+            self.rate = min(
+                self.max_rate,
+                self.window_rate
+                * (1 + self.ramp_factor * elapsed / self.ramp_interval),
+            )
+
+    def record_failure(self):
+        with self.lock:
+            self.retries += 1
+            self._back_off(time.monotonic())
+
+    def _back_off(self, now):
+        # several in-flight commits tend to fail together, so only back off
+        # once per cooldown period
+        if now - self.last_backoff < self.cooldown:
+            return
+        self.last_backoff = now
+        self.backoffs += 1
+        self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+        self.window_rate = self.rate
+        self.window_start = now
+        # latency is judged afresh at the new rate
+        self.latency = None
+        self.best_latency = None
+
+    def status(self):
+        return f"Rate: {self.rate:.0f} ops/second, retries: {self.retries}"
+
+
+def note_retry(retry_state):
+    """tenacity `before_sleep` hook: tells the controller passed to the
+    retried function (as the `controller` keyword) that a commit failed"""
+    controller = retry_state.kwargs.get("controller")
+    if controller is not None:
+        controller.record_failure()
@@ -0,0 +1,348 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import urllib.request
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted
+from google.cloud import firestore as cloud_firestore
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+
+class FirestoreBackend:
+    """Documents stored in Firestore. The client is only created on first
+    use, so importing a script that uses it needs no credentials"""
+
+    def __init__(self, credentials_path="serviceAccountKey.json"):
+        self.credentials_path = credentials_path
+        self._client = None
+        self.lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self.lock:
+            if self._client is None:
+                self._client = self.create_client()
+            return self._client
+
+    def create_client(self):
+        # Initialize Firebase Admin SDK
+        cred = credentials.Certificate(self.credentials_path)
+        firebase_admin.initialize_app(cred)
+        return firestore.client()
+
+    def batch(self):
+        return FirestoreBatch(self.client)
+
+    def get(self, collection, doc_id):
+        """The document's fields, or None if it doesn't exist"""
+        doc = self.client.collection(collection).document(doc_id).get()
+        return (doc.to_dict() or {}) if doc.exists else None
+
+    def list_ids(
+        self,
+        collection,
+        start_at=None,
+        start_after=None,
+        end_before=None,
+        limit=None,
+    ):
+        """Ids in a key range of a collection, in order"""
+        # only the ids are needed. An empty projection would return every
+        # field, so project onto the document name alone
+        query = (
+            self.client.collection(collection)
+            .order_by("__name__")
+            .select(["__name__"])
+        )
+        if start_after is not None:
+            query = query.start_after([start_after])
+        elif start_at is not None:
+            query = query.start_at([start_at])
+        if end_before is not None:
+            query = query.end_before([end_before])
+        if limit is not None:
+            query = query.limit(limit)
+        return [doc.id for doc in query.stream()]
+
+    def bulk_deleter(self, initial_rate=500, max_rate=10_000):
+        """Deletes through a BulkWriter, which batches, paces (ramping up
+        500/50/5 style) and retries on its own"""
+        return FirestoreBulkDeleter(
+            self.client,
+            BulkWriterOptions(
+                initial_ops_per_second=initial_rate,
+                max_ops_per_second=max_rate,
+            ),
+        )
+
+
+class FirestoreEmulatorBackend(FirestoreBackend):
+    """Documents stored in a local Firestore emulator, started with e.g.
+    `gcloud emulators firestore start --host-port=localhost:8080`"""
+
+    def __init__(self, host="localhost:8080", project="us-post-data-local"):
+        super().__init__()
+        self.host = host
+        self.project = project
+
+    def create_client(self):
+        # the client library talks to the emulator, without credentials,
+        # whenever this is set
+        os.environ["FIRESTORE_EMULATOR_HOST"] = self.host
+        return cloud_firestore.Client(project=self.project)
+
+    def reset(self):
+        """Throw away every document in the emulator"""
+        request = urllib.request.Request(
+            f"http://{self.host}/emulator/v1/projects/{self.project}"
+            "/databases/(default)/documents",
+            method="DELETE",
+        )
+        urllib.request.urlopen(request).close()
+
+
+class FirestoreBatch:
+    def __init__(self, client):
+        self.client = client
+        self.batch = client.batch()
+
+    def set(self, collection, doc_id, data):
+        self.batch.set(
+            self.client.collection(collection).document(doc_id), data
+        )
+
+    def delete(self, collection, doc_id):
+        self.batch.delete(self.client.collection(collection).document(doc_id))
+
+    def commit(self):
+        self.batch.commit()
+
+
+class FirestoreBulkDeleter:
+    def __init__(self, client, options):
+        self.client = client
+        self.writer = client.bulk_writer(options=options)
+
+    def delete(self, collection, doc_id):
+        self.writer.delete(self.client.collection(collection).document(doc_id))
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+
+class SQLiteBackend:
+    """Stand-in for Firestore backed by SQLite (in memory by default), for
+    running and timing the upload and delete code without credentials.
+
+    Every batch commit waits `latency` seconds and fails with
+    ResourceExhausted with probability `fault_rate`, like Firestore does
+    when it's written to faster than it can take. Ids sort by code point,
+    as in Firestore.
+    """
+
+    def __init__(self, path=":memory:", latency=0.0, fault_rate=0.0, seed=None):
+        self.latency = latency
+        self.fault_rate = fault_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "collection TEXT, doc_id TEXT, data TEXT, "
+            "PRIMARY KEY (collection, doc_id))"
+        )
+        self.conn.commit()
+        self.commits = 0
+        self.faults = 0
+
+    def batch(self):
+        return SQLiteBatch(self)
+
+    def apply(self, sets, deletes):
+        """Commit a batch of writes atomically, after the configured latency
+        and with the configured chance of failing"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            if self.fault_rate and self.random.random() < self.fault_rate:
+                self.faults += 1
+                raise ResourceExhausted("Injected fault: quota exceeded")
+            self.commits += 1
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO documents VALUES (?, ?, ?)",
+                    [
+                        (collection, doc_id, json.dumps(data))
+                        for collection, doc_id, data in sets
+                    ],
+                )
+                self.conn.executemany(
+                    "DELETE FROM documents WHERE collection = ? AND doc_id = ?",
+                    deletes,
+                )
+
+    def get(self, collection, doc_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data FROM documents WHERE collection = ? AND doc_id = ?",
+                (collection, doc_id),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_ids(
+        self,
+        collection,
+        start_at=None,
+        start_after=None,
+        end_before=None,
+        limit=None,
+    ):
+        sql = "SELECT doc_id FROM documents WHERE collection = ?"
+        params = [collection]
+        if start_after is not None:
+            sql += " AND doc_id > ?"
+            params.append(start_after)
+        elif start_at is not None:
+            sql += " AND doc_id >= ?"
+            params.append(start_at)
+        if end_before is not None:
+            sql += " AND doc_id < ?"
+            params.append(end_before)
+        sql += " ORDER BY doc_id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self.lock:
+            return [row[0] for row in self.conn.execute(sql, params)]
+
+    def reset(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM documents")
+
+    def count(self, collection):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM documents WHERE collection = ?",
+                (collection,),
+            ).fetchone()[0]
+
+    def bulk_deleter(self, initial_rate=500, max_rate=10_000):
+        return SQLiteBulkDeleter(self)
+
+
+class SQLiteBatch:
+    def __init__(self, backend):
+        self.backend = backend
+        self.sets = []
+        self.deletes = []
+
+    def set(self, collection, doc_id, data):
+        self.sets.append((collection, doc_id, data))
+
+    def delete(self, collection, doc_id):
+        self.deletes.append((collection, doc_id))
+
+    def commit(self):
+        self.backend.apply(self.sets, self.deletes)
+
+
+class SQLiteBulkDeleter:
+    """Queues deletes and commits them in batches of `batch_size`, retrying
+    the injected faults the way BulkWriter retries Firestore's"""
+
+    def __init__(self, backend, batch_size=20):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.pending = []
+
+    def delete(self, collection, doc_id):
+        self.pending.append((collection, doc_id))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    @retry(
+        stop=stop_after_attempt(10),
+        wait=wait_exponential(multiplier=0.1, max=2),
+        retry=retry_if_exception_type((ResourceExhausted, DeadlineExceeded)),
+    )
+    def commit(self, deletes):
+        self.backend.apply([], deletes)
+
+    def flush(self):
+        while self.pending:
+            deletes = self.pending[: self.batch_size]
+            self.commit(deletes)
+            del self.pending[: self.batch_size]
+
+    def close(self):
+        self.flush()
+
+
+BACKENDS = ["firestore", "emulator", "sqlite"]
+
+
+def add_backend_arguments(parser):
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="firestore",
+        help="Where the documents live: Firestore, the local Firestore "
+        "emulator, or a SQLite stand-in for trying things out without "
+        "credentials (default: firestore)",
+    )
+    parser.add_argument(
+        "--credentials",
+        type=str,
+        default="serviceAccountKey.json",
+        help="Firebase service account key (default: serviceAccountKey.json)",
+    )
+    parser.add_argument(
+        "--emulator-host",
+        type=str,
+        default=os.environ.get("FIRESTORE_EMULATOR_HOST", "localhost:8080"),
+        help="host:port of the Firestore emulator (default: "
+        "$FIRESTORE_EMULATOR_HOST or localhost:8080)",
+    )
+    parser.add_argument(
+        "--sqlite-path",
+        type=str,
+        default=":memory:",
+        help="Database file for the sqlite backend (default: in memory)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Seconds each sqlite batch commit takes (default: 0)",
+    )
+    parser.add_argument(
+        "--fault-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of sqlite batch commits that fail with "
+        "ResourceExhausted (default: 0)",
+    )
+
+
+def backend_from_args(args):
+    if args.backend == "emulator":
+        return FirestoreEmulatorBackend(args.emulator_host)
+    if args.backend == "sqlite":
+        return SQLiteBackend(
+            args.sqlite_path, latency=args.latency, fault_rate=args.fault_rate
+        )
+    return FirestoreBackend(args.credentials)
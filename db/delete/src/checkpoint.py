@@ -0,0 +1,67 @@
+import json
+import os
+import threading
+
+
+class DeleteCheckpoint:
+    """Progress of a partitioned delete: for every partition of the key
+    range, the last document id deleted and whether it's finished. Saved
+    after every flushed page so an interrupted run carries on where each
+    partition stopped instead of rescanning the deleted ranges. The
+    checkpoint is removed once every partition is done.
+    """
+
+    def __init__(self, checkpoint_dir, collection, prefix):
+        name = f"{collection}-{prefix}" if prefix else collection
+        self.path = os.path.join(checkpoint_dir, f"{name}.json")
+        self.collection = collection
+        self.prefix = prefix
+        self.partitions = []
+        self.lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        with open(self.path) as f:
+            saved = json.load(f)
+        if (
+            saved["collection"] != self.collection
+            or saved["prefix"] != self.prefix
+        ):
+            raise ValueError(f"{self.path} belongs to another delete")
+        self.partitions = saved["partitions"]
+        return self.partitions
+
+    def start(self, key_ranges):
+        self.partitions = [
+            {"start": start, "end": end, "last_id": None, "done": False}
+            for start, end in key_ranges
+        ]
+        self.save()
+        return self.partitions
+
+    def record(self, partition, last_id, done=False):
+        with self.lock:
+            partition["last_id"] = last_id
+            partition["done"] = done
+            self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "collection": self.collection,
+                    "prefix": self.prefix,
+                    "partitions": self.partitions,
+                },
+                f,
+                indent=2,
+            )
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if self.exists():
+            os.remove(self.path)
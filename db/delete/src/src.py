@@ -0,0 +1,282 @@
+import argparse
+import logging
+import string
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from checkpoint import DeleteCheckpoint
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "common"))
+from dataset_manifest import DatasetManifest
+from storage import (
+    FirestoreBackend,
+    add_backend_arguments,
+    backend_from_args,
+)
+
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+# Where the documents are deleted from; main swaps in the backend picked on
+# the command line. The Firestore client is only created on first use
+storage = FirestoreBackend()
+
+# Where the checkpoints of interrupted deletes are kept
+CHECKPOINT_DIR = "data/checkpoints"
+
+# Characters document ids are split on, in Firestore's (code point) order
+KEY_ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase
+
+# Upper bound for every id that starts with a prefix
+PREFIX_END = "\uf8ff"
+
+
+def state_prefix(state_name):
+    return f"{state_name}-processed.csv_"
+
+
+def split_key_range(prefix, partitions, alphabet=KEY_ALPHABET):
+    """Split the ids starting with `prefix` into `partitions` contiguous
+    [start, end) ranges, cut at evenly spaced characters of the next
+    position (or next two, when one doesn't give enough cut points). None
+    means the range is open on that side"""
+    if partitions <= len(alphabet):
+        candidates = list(alphabet)
+    else:
+        candidates = [a + b for a in alphabet for b in alphabet]
+    partitions = max(1, min(partitions, len(candidates)))
+    cuts = [
+        prefix + candidates[i * len(candidates) // partitions]
+        for i in range(1, partitions)
+    ]
+    starts = [prefix or None] + cuts
+    ends = cuts + [prefix + PREFIX_END if prefix else None]
+    return list(zip(starts, ends, strict=False))
+
+
+def next_page(collection, partition, page_size):
+    """The next ids to delete in a partition"""
+    if partition["last_id"] is not None:
+        start = {"start_after": partition["last_id"]}
+    else:
+        start = {"start_at": partition["start"]}
+    return storage.list_ids(
+        collection, end_before=partition["end"], limit=page_size, **start
+    )
+
+
+class DeleteProgress:
+    def __init__(self):
+        self.deleted = 0
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+
+    def add(self, count):
+        with self.lock:
+            self.deleted += count
+            return self.deleted
+
+    def rate(self):
+        elapsed = time.time() - self.start_time
+        return self.deleted / elapsed if elapsed else 0.0
+
+
+def delete_partition(
+    collection, partition, checkpoint, progress, page_size, rates
+):
+    """Delete every document in one key range, a page at a time, through
+    this partition's own bulk deleter"""
+    if partition["done"]:
+        return 0
+    writer = storage.bulk_deleter(*rates)
+    deleted = 0
+    try:
+        while True:
+            doc_ids = next_page(collection, partition, page_size)
+            if not doc_ids:
+                break
+            for doc_id in doc_ids:
+                writer.delete(collection, doc_id)
+            # wait for the page to land before checkpointing past it
+            writer.flush()
+            deleted += len(doc_ids)
+            total = progress.add(len(doc_ids))
+            checkpoint.record(partition, doc_ids[-1])
+            logging.info(
+                f"Partition {partition['start']!r}: deleted {deleted} "
+                f"documents. Total deleted: {total} "
+                f"({progress.rate():.2f} documents/second)"
+            )
+    finally:
+        writer.close()
+    checkpoint.record(partition, partition["last_id"], done=True)
+    return deleted
+
+
+def delete_documents(
+    collection,
+    prefix="",
+    partitions=16,
+    workers=8,
+    page_size=1000,
+    initial_rate=500,
+    max_rate=10_000,
+    checkpoint_dir=CHECKPOINT_DIR,
+    alphabet=KEY_ALPHABET,
+):
+    """Delete every document in `collection` whose id starts with `prefix`,
+    splitting the id range into partitions that are deleted concurrently.
+    `alphabet` is what the ids can continue with after the prefix"""
+    checkpoint = DeleteCheckpoint(checkpoint_dir, collection, prefix)
+    if checkpoint.exists():
+        ranges = checkpoint.load()
+        remaining = sum(1 for partition in ranges if not partition["done"])
+        logging.info(
+            f"Resuming delete from {checkpoint.path}: {remaining} of "
+            f"{len(ranges)} partitions left"
+        )
+    else:
+        ranges = checkpoint.start(split_key_range(prefix, partitions, alphabet))
+
+    # every worker gets its own BulkWriter, so they share the rate budget;
+    # each one ramps up 500/50/5 style from its share of the initial rate
+    rates = (max(1, initial_rate // workers), max(1, max_rate // workers))
+    progress = DeleteProgress()
+    target = f"'{collection}'" + (f" with prefix '{prefix}'" if prefix else "")
+    logging.info(
+        f"Deleting documents in {target} across {len(ranges)} partitions "
+        f"with {workers} workers"
+    )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                delete_partition,
+                collection,
+                partition,
+                checkpoint,
+                progress,
+                page_size,
+                rates,
+            )
+            for partition in ranges
+        ]
+        for future in futures:
+            # re-raises the first partition that failed; the checkpoint
+            # keeps everything the others got through
+            future.result()
+
+    checkpoint.remove()
+    total_duration = time.time() - progress.start_time
+    logging.info(f"Finished deleting documents in {target}.")
+    logging.info(f"Total deleted: {progress.deleted} documents")
+    logging.info(f"Total time taken: {total_duration:.2f} seconds")
+    logging.info(
+        f"Average deletion rate: {progress.rate():.2f} documents per second"
+    )
+    return progress.deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Delete documents from a Firestore collection"
+    )
+    parser.add_argument(
+        "--collection",
+        type=str,
+        required=True,
+        help="Collection to delete documents from",
+    )
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument(
+        "--prefix",
+        type=str,
+        default="",
+        help="Only delete documents whose id starts with this prefix "
+        "(default: the whole collection)",
+    )
+    target.add_argument(
+        "--state",
+        type=str,
+        help="Only delete the documents uploaded for this state, i.e. the "
+        "ids starting with '<state>-processed.csv_'",
+    )
+    parser.add_argument(
+        "--partitions",
+        type=int,
+        default=16,
+        help="Number of id ranges to split the delete into (default: 16)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of partitions deleted at once (default: 8)",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=1000,
+        help="Documents read and deleted per round trip (default: 1000)",
+    )
+    parser.add_argument(
+        "--initial-rate",
+        type=int,
+        default=500,
+        help="Starting delete rate in documents/second, shared by the "
+        "workers (default: 500)",
+    )
+    parser.add_argument(
+        "--max-rate",
+        type=int,
+        default=10_000,
+        help="Upper bound on the delete rate in documents/second "
+        "(default: 10000)",
+    )
+    add_backend_arguments(parser)
+    parser.add_argument(
+        "--checkpoint-dir",
+        type=str,
+        default=CHECKPOINT_DIR,
+        help="Directory for the checkpoints used to resume interrupted "
+        f"deletes (default: {CHECKPOINT_DIR})",
+    )
+    args = parser.parse_args()
+
+    global storage
+    storage = backend_from_args(args)
+
+    if args.state:
+        # uploaded documents are numbered after the state prefix
+        prefix, alphabet = state_prefix(args.state), string.digits
+    else:
+        prefix, alphabet = args.prefix, KEY_ALPHABET
+    delete_documents(
+        args.collection,
+        prefix=prefix,
+        partitions=args.partitions,
+        workers=args.workers,
+        page_size=args.page_size,
+        initial_rate=args.initial_rate,
+        max_rate=args.max_rate,
+        checkpoint_dir=args.checkpoint_dir,
+        alphabet=alphabet,
+    )
+
+    # keep the upload manifest in step with what's left
+    manifest = DatasetManifest(storage, args.collection)
+    if args.state:
+        manifest.remove(args.state)
+    elif not prefix:
+        manifest.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
-import io
+import argparse
 import os
+import sys
+from pathlib import Path
 
 import pandas as pd
-import requests
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "common"))
+from downloader import download_states, print_summary, write_report
 
 
 # Dictionary of states with their respective Dropbox links
@@ -36,31 +41,66 @@ state_links = {
     "wyoming": "https://www.dropbox.com/scl/fi/4c0bb071llxee25vzw4vm/wyoming_index.csv?rlkey=1ihzu4lme06urgrszldkdg0ns&st=gduoqyhf&dl=1",
 }
 
-if __name__ == "__main__":
+
+def write_parquet(csv_path, file_path):
+    """Convert a downloaded csv to parquet through a temp file. Every column
+    is kept as text, as db/preprocess reads csv, so both formats carry the
+    same values"""
+    tmp_path = file_path + ".tmp"
+    pd.read_csv(csv_path, dtype=str).to_parquet(
+        tmp_path, index=False, compression="zstd"
+    )
+    os.replace(tmp_path, file_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download state index files")
+    parser.add_argument(
+        "--format",
+        choices=["csv", "parquet"],
+        default="csv",
+        help="Format to save the index files in (default: csv)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of files to download at once (default: 4)",
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Check every downloaded csv parses before keeping it",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Download every file again, even if the server says it hasn't "
+        "changed",
+    )
+    args = parser.parse_args()
+
     # Directory to save the CSV files
     output_dir = "data/output"
 
     # Create the directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
 
-    # Download and save the CSV files
-    for state, url in state_links.items():
-        state_dir = os.path.join(output_dir, state)
-        os.makedirs(state_dir, exist_ok=True)
-        file_path = os.path.join(state_dir, f"{state}_index.csv")
-
-        # Check if the file already exists
-        if os.path.exists(file_path):
-            print(f"{file_path} already exists. Skipping download.")
-            continue
+    # Download and save the files; csv is kept byte for byte as downloaded
+    results = download_states(
+        state_links,
+        lambda state: os.path.join(
+            output_dir, state, f"{state}_index.{args.format}"
+        ),
+        os.path.join(output_dir, "download-cache.json"),
+        workers=args.workers,
+        validate=args.validate,
+        convert=write_parquet if args.format == "parquet" else None,
+        force=args.force,
+    )
+    print_summary(results)
+    write_report(results, os.path.join(output_dir, "download-report.json"))
 
-        # Download the file if it doesn't exist
-        response = requests.get(url)
-        response.raise_for_status()  # Ensure the download was successful
 
-        # Read the CSV file into a pandas DataFrame
-        csv_data = pd.read_csv(io.StringIO(response.text))
-
-        # Save the DataFrame to a CSV file
-        csv_data.to_csv(file_path, index=False)
-        print(f"Saved {state} data to {file_path}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import src as preprocess
+from generate_index import parse_rows, write_state_index
+
+
+BENCH_STATE = "bench"
+
+# The steps of process_state_in_memory, in the order apply_transformations
+# runs them
+STEPS = [
+    ("case_cols", preprocess.case_cols),
+    ("clean_column_names", preprocess.clean_column_names),
+    ("clean_dates", preprocess.clean_dates),
+    ("clean_agency_names", preprocess.clean_agency_names),
+    ("check_empty_values", preprocess.check_empty_values),
+    ("apply_proper_casing", preprocess.apply_proper_casing),
+    ("filter_anons", preprocess.filter_anons),
+    ("check_required_columns", preprocess.check_required_columns),
+    ("sort_by_uid", preprocess.sort_by_uid),
+    ("collapse_contiguous_stints", preprocess.collapse_contiguous_stints),
+    (
+        "add_state_fields",
+        lambda df: preprocess.add_state_fields(df, BENCH_STATE),
+    ),
+]
+
+
+def peak_rss_mb():
+    # on Linux ru_maxrss carries over from the parent through fork and exec,
+    # so read the high-water mark of this process's own memory instead
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def time_steps(input_file_path, output_dir):
+    """Run the in-memory pipeline one step at a time. Runs in its own
+    process so the peak memory is this size's alone"""
+    timings = {}
+    with (
+        open(os.devnull, "w") as devnull,
+        contextlib.redirect_stdout(devnull),
+        warnings.catch_warnings(),
+    ):
+        # the pipeline's own warnings would bury the results
+        warnings.simplefilter("ignore")
+        start = time.perf_counter()
+        df = preprocess.read_state_data(input_file_path)
+        timings["read_state_data"] = time.perf_counter() - start
+        for name, step in STEPS:
+            start = time.perf_counter()
+            df = step(df)
+            timings[name] = time.perf_counter() - start
+        start = time.perf_counter()
+        preprocess.write_state_data(
+            df,
+            preprocess.get_output_file_path(output_dir, BENCH_STATE),
+        )
+        timings["write_state_data"] = time.perf_counter() - start
+    timings["total"] = sum(timings.values())
+    timings["peak_rss_mb"] = peak_rss_mb()
+    return timings
+
+
+def time_streaming(input_dir, output_dir, max_memory_mb):
+    """process_state_data end to end in bounded-memory mode. Raises if the
+    run failed, so a fast failure isn't reported as a timing"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        start = time.perf_counter()
+        result = preprocess.process_state_data(
+            BENCH_STATE,
+            input_dir,
+            output_dir,
+            force=True,
+            collapse_states={"all"},
+            max_memory_mb=max_memory_mb,
+        )
+        seconds = time.perf_counter() - start
+    if result != "success":
+        # process_state_data catches its own errors and prints them
+        errors = [
+            line
+            for line in output.getvalue().splitlines()
+            if line.startswith("Error")
+        ]
+        raise RuntimeError(
+            f"Streaming run {result}: {errors[-1] if errors else 'no error'}"
+        )
+    return {"total": seconds, "peak_rss_mb": peak_rss_mb()}
+
+
+def run_isolated(func, *args):
+    # a fresh interpreter per run, so peak memory isn't carried over
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(func, *args).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time each preprocess step and the peak memory on "
+        "synthetic state files of increasing size"
+    )
+    parser.add_argument(
+        "--sizes",
+        type=parse_rows,
+        nargs="+",
+        default=[parse_rows(size) for size in ["10k", "100k", "1M"]],
+        help="Input sizes in rows, e.g. 10k 1M 20M (default: 10k 100k 1M)",
+    )
+    parser.add_argument(
+        "--data-dir",
+        type=str,
+        default="data/synthetic/bench",
+        help="Where the generated inputs are kept between runs "
+        "(default: data/synthetic/bench)",
+    )
+    parser.add_argument(
+        "--max-memory-mb",
+        type=int,
+        help="Also time the streaming mode end to end with this ceiling",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="Also write the results table to this csv file",
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for rows in args.sizes:
+        input_dir = os.path.join(args.data_dir, str(rows))
+        input_file_path = preprocess.get_input_file_path(input_dir, BENCH_STATE)
+        if not os.path.exists(input_file_path):
+            print(f"Generating {rows} rows...")
+            write_state_index(input_file_path, rows)
+
+        print(f"Timing {rows} rows...")
+        with tempfile.TemporaryDirectory() as output_dir:
+            os.makedirs(os.path.join(output_dir, BENCH_STATE))
+            results[f"{rows} rows"] = run_isolated(
+                time_steps, input_file_path, output_dir
+            )
+        if args.max_memory_mb:
+            with tempfile.TemporaryDirectory() as output_dir:
+                streaming = run_isolated(
+                    time_streaming, input_dir, output_dir, args.max_memory_mb
+                )
+            results[f"{rows} rows"]["streaming_total"] = streaming["total"]
+            results[f"{rows} rows"]["streaming_peak_rss_mb"] = streaming[
+                "peak_rss_mb"
+            ]
+
+    table = pd.DataFrame(results).round(3)
+    table.index.name = "seconds per step"
+    print()
+    print(table.to_string())
+    if args.output:
+        table.to_csv(args.output)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
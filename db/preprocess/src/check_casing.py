@@ -0,0 +1,139 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from src import PROPER_CASE_COLUMNS, apply_proper_casing, case_cols
+
+
+def legacy_proper_case(text):
+    """The original per-cell implementation, kept here as the reference"""
+    words = text.split()
+    processed_words = []
+    for word in words:
+        if word.lower() == "sheriff's":
+            processed_words.append("Sheriff's")
+        elif word.upper() in [
+            "I",
+            "II",
+            "III",
+            "IV",
+            "V",
+            "VI",
+            "VII",
+            "VIII",
+            "IX",
+            "X",
+            "JR",
+            "SR",
+        ]:
+            if word.upper() in ["JR", "SR"]:
+                processed_words.append(word.capitalize())
+            else:
+                processed_words.append(word.upper())
+        elif word.upper() in ["PD", "SO", "DA", "UC"]:
+            processed_words.append(word.upper())
+        else:
+            processed_words.append(word.capitalize())
+    return " ".join(processed_words)
+
+
+def legacy_apply_proper_casing(df):
+    for col in PROPER_CASE_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].apply(
+                lambda x: legacy_proper_case(str(x)) if pd.notna(x) else x
+            )
+    return df
+
+
+def make_sample(nrows, seed=0):
+    """Rows built from words that exercise every casing rule"""
+    rng = np.random.default_rng(seed)
+    words = np.array(
+        [
+            "sheriff's",
+            "SHERIFF'S",
+            "ii",
+            "iv",
+            "x",
+            "jr",
+            "SR",
+            "pd",
+            "so",
+            "da",
+            "uc",
+            "police",
+            "department",
+            "o'neil",
+            "mcdonald",
+            "van",
+            "de-la-cruz",
+            "county",
+            "office",
+            "",
+        ]
+    )
+
+    def column(nwords):
+        picks = rng.choice(words, size=(nrows, nwords))
+        return pd.Series([" ".join(row) for row in picks])
+
+    df = pd.DataFrame(
+        {
+            "first_name": column(1),
+            "last_name": column(2),
+            "middle_name": column(1),
+            "agency_name": column(3),
+            "separation_reason": column(2),
+            "race": rng.choice(["white", "black", "asian", "hispanic"], nrows),
+            "sex": rng.choice(["m", "f", "male", "female"], nrows),
+            "suffix": rng.choice(["jr", "sr", "iii", ""], nrows),
+        }
+    )
+    df.loc[rng.random(nrows) < 0.05, "middle_name"] = np.nan
+    return df
+
+
+def timed(func, df):
+    start = time.time()
+    out = func(df.copy())
+    return out, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check the proper casing engine against the original "
+        "per-cell implementation and compare timings"
+    )
+    parser.add_argument(
+        "--input",
+        type=str,
+        help="Optional <state>_index.csv to check instead of generated data",
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=1_000_000,
+        help="Number of generated rows when no input is given",
+    )
+    args = parser.parse_args()
+
+    if args.input:
+        df = case_cols(pd.read_csv(args.input))
+    else:
+        df = make_sample(args.rows)
+    print(f"Checking {len(df)} rows")
+
+    expected, legacy_secs = timed(legacy_apply_proper_casing, df)
+    actual, new_secs = timed(apply_proper_casing, df)
+
+    pd.testing.assert_frame_equal(actual, expected)
+    print("Output matches the per-cell implementation")
+    print(f"Per-cell:   {legacy_secs:.2f} seconds")
+    print(f"Vectorized: {new_secs:.2f} seconds")
+    print(f"Speedup:    {legacy_secs / new_secs:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
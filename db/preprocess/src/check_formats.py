@@ -0,0 +1,109 @@
+import argparse
+import contextlib
+import gzip
+import importlib.util
+import io
+import os
+import tempfile
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import src as preprocess
+from generate_index import parse_rows, write_state_index
+
+
+# db/download/src/src.py can't be imported by name next to this src.py
+spec = importlib.util.spec_from_file_location(
+    "download", Path(__file__).resolve().parents[2] / "download/src/src.py"
+)
+download = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(download)
+
+CHECK_STATE = "florida"
+
+
+def getargs():
+    parser = argparse.ArgumentParser(
+        description="Check that preprocessing the csv and the parquet "
+        "download of the same index gives byte-identical output"
+    )
+    parser.add_argument(
+        "--rows",
+        type=parse_rows,
+        default=parse_rows("50k"),
+        help="Rows in the generated index (default: 50k)",
+    )
+    parser.add_argument(
+        "--max-memory-mb",
+        type=int,
+        default=20,
+        help="Ceiling for the streaming runs (default: 20)",
+    )
+    return parser.parse_args()
+
+
+def make_index(path, rows):
+    """A generated index with the values type inference trips over: blank
+    and zero-padded person_nbrs, and years of birth with blanks"""
+    write_state_index(path, rows)
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    rng = np.random.default_rng(1)
+    padded = rng.random(len(df)) < 0.05
+    df.loc[padded, "person_nbr"] = "00" + df.loc[padded, "person_nbr"]
+    df.loc[rng.random(len(df)) < 0.01, "person_nbr"] = ""
+    df.to_csv(path, index=False)
+
+
+def preprocess_output(input_dir, output_dir, input_format, max_memory_mb):
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        # the pipeline's own warnings would bury the results
+        warnings.simplefilter("ignore")
+        result = preprocess.process_state_data(
+            CHECK_STATE,
+            input_dir,
+            output_dir,
+            force=True,
+            input_format=input_format,
+            max_memory_mb=max_memory_mb,
+        )
+    assert result == "success", f"{input_format} run {result}"
+    path = preprocess.get_output_file_path(output_dir, CHECK_STATE)
+    with gzip.open(path, "rb") as f:
+        return f.read()
+
+
+if __name__ == "__main__":
+    args = getargs()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_dir = os.path.join(tmp_dir, "input")
+        csv_path = preprocess.get_input_file_path(input_dir, CHECK_STATE)
+        os.makedirs(os.path.dirname(csv_path))
+        make_index(csv_path, args.rows)
+        download.write_parquet(
+            csv_path,
+            preprocess.get_input_file_path(input_dir, CHECK_STATE, "parquet"),
+        )
+
+        for mode, max_memory_mb in [
+            ("in memory", None),
+            ("streaming", args.max_memory_mb),
+        ]:
+            outputs = {
+                input_format: preprocess_output(
+                    input_dir,
+                    os.path.join(tmp_dir, f"{input_format}-{max_memory_mb}"),
+                    input_format,
+                    max_memory_mb,
+                )
+                for input_format in ["csv", "parquet"]
+            }
+            assert outputs["csv"] == outputs["parquet"], (
+                f"csv and parquet inputs differ {mode}"
+            )
+            print(
+                f"{mode}: csv and parquet inputs give identical output "
+                f"({len(outputs['csv'])} bytes)"
+            )
@@ -0,0 +1,121 @@
+import argparse
+import datetime
+import time
+
+import numpy as np
+import pandas as pd
+from src import clean_date, collapse_contiguous_stints
+
+
+DEFAULT_BY_COLS = ["person_nbr", "first_name", "last_name", "agency_name"]
+
+
+def legacy_collapse_contiguous_stints(df, by_cols):
+    """The original groupby-aggregate implementation, kept as the reference"""
+    one_day = pd.to_timedelta(1, "days")
+    today = pd.to_datetime(datetime.date.today(), utc=False)
+    ancient = pd.to_datetime("1800-01-01", utc=False)
+    working = df.sort_values(
+        ["person_nbr", "agency_name", "start_date"], inplace=False
+    )
+    working["start_date"] = working["start_date"].apply(clean_date)
+    working["end_date"] = working["end_date"].apply(clean_date)
+    working["start_date"] = pd.to_datetime(
+        working.start_date, utc=False
+    ).fillna(ancient)
+    working["end_date"] = pd.to_datetime(working.end_date, utc=False).fillna(
+        today
+    )
+    working.loc[working.start_date < ancient, "start_date"] = ancient
+    working.loc[working.end_date > today, "end_date"] = today
+    grouped = working.groupby(by_cols)
+    working["prv_end"] = grouped["end_date"].shift(1, fill_value=today)
+    working["new_stint"] = (working.start_date - working.prv_end) > one_day
+    working["stint_id"] = grouped["new_stint"].cumsum()
+    collapsible = working.groupby(by_cols + ["stint_id"])
+    summaries = {k: lambda x: x.tail(1) for k in df.columns if k not in by_cols}
+    summaries["start_date"] = "min"
+    summaries["end_date"] = "max"
+    out = collapsible.aggregate(summaries).reset_index()
+    out["start_date"] = out["start_date"].dt.strftime("%Y-%m-%d")
+    out["end_date"] = out["end_date"].dt.strftime("%Y-%m-%d")
+    out.loc[out.end_date == today.strftime("%Y-%m-%d"), "end_date"] = None
+    out.loc[out.start_date == ancient.strftime("%Y-%m-%d"), "start_date"] = None
+    return out.drop(["stint_id"], axis=1, inplace=False)
+
+
+def make_sample(npeople, seed=0):
+    """Multi-stint careers with overlapping, contiguous and gapped stints,
+    plus missing and out-of-range dates"""
+    rng = np.random.default_rng(seed)
+    nrows = npeople * 4
+    start = pd.to_datetime("1990-01-01") + pd.to_timedelta(
+        rng.integers(0, 12000, nrows), "D"
+    )
+    end = start + pd.to_timedelta(rng.integers(-5, 2000, nrows), "D")
+    start_date = start.strftime("%Y-%m-%d").to_numpy(dtype=object)
+    end_date = end.strftime("%Y-%m-%d").to_numpy(dtype=object)
+    end_date[rng.random(nrows) < 0.2] = ""
+    start_date[rng.random(nrows) < 0.01] = "0201-01-01"
+    end_date[rng.random(nrows) < 0.01] = "2999-01-01"
+    person = rng.integers(0, npeople, nrows).astype(str)
+    return pd.DataFrame(
+        {
+            "person_nbr": person,
+            "first_name": np.char.add("First", person),
+            "last_name": np.char.add("Last", person),
+            "agency_name": rng.choice(
+                ["Springfield Police Department", "Shelby County SO"], nrows
+            ),
+            "start_date": start_date,
+            "end_date": end_date,
+            "separation_reason": rng.choice(["Resigned", "Retired", ""], nrows),
+            "sex": rng.choice(["M", "F"], nrows),
+        }
+    )
+
+
+def timed(func, df):
+    start = time.time()
+    out = func(df.copy())
+    return out, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check the stint collapsing engine against the original "
+        "groupby implementation and compare timings"
+    )
+    parser.add_argument(
+        "--input",
+        type=str,
+        help="Optional processed state file to check instead of generated data",
+    )
+    parser.add_argument(
+        "--people",
+        type=int,
+        default=50_000,
+        help="Number of generated people when no input is given",
+    )
+    args = parser.parse_args()
+
+    if args.input:
+        df = pd.read_csv(args.input, dtype=str, keep_default_na=False)
+    else:
+        df = make_sample(args.people)
+    print(f"Checking {len(df)} rows")
+
+    expected, legacy_secs = timed(
+        lambda x: legacy_collapse_contiguous_stints(x, DEFAULT_BY_COLS), df
+    )
+    actual, new_secs = timed(collapse_contiguous_stints, df)
+
+    pd.testing.assert_frame_equal(actual, expected)
+    print("Output matches the groupby implementation")
+    print(f"Groupby:     {legacy_secs:.2f} seconds")
+    print(f"Array-based: {new_secs:.2f} seconds")
+    print(f"Speedup:     {legacy_secs / new_secs:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+
+def write_sorted_run(df, key, run_dir, run_number):
+    """Stable sort one chunk by `key` and spill it to disk as a parquet run"""
+    path = os.path.join(run_dir, f"run-{run_number:05d}.parquet")
+    df.sort_values(key, kind="stable").to_parquet(path, index=False)
+    return path
+
+
+def merge_sorted_runs(run_paths, key, batch_rows):
+    """Merge sorted runs back together, yielding sorted DataFrames.
+
+    Each run is read `batch_rows` at a time. Every round emits the rows whose
+    key is below the smallest "last key" of the runs still being read, so
+    nothing unread can sort before them, and all rows sharing a key are always
+    emitted together. Ties keep run order, which gives the same result as one
+    stable sort over the chunks in input order.
+    """
+    readers = [
+        pq.ParquetFile(path).iter_batches(batch_size=batch_rows)
+        for path in run_paths
+    ]
+    buffers = [None] * len(readers)
+    exhausted = [False] * len(readers)
+
+    def refill(i):
+        for batch in readers[i]:
+            if batch.num_rows == 0:
+                continue
+            frame = batch.to_pandas()
+            if buffers[i] is None or buffers[i].empty:
+                buffers[i] = frame
+            else:
+                buffers[i] = pd.concat([buffers[i], frame], ignore_index=True)
+            return
+        exhausted[i] = True
+
+    for i in range(len(readers)):
+        refill(i)
+
+    while True:
+        live = [i for i in range(len(readers)) if not exhausted[i]]
+        if not live:
+            pieces = [b for b in buffers if b is not None and not b.empty]
+            if pieces:
+                yield pd.concat(pieces, ignore_index=True).sort_values(
+                    key, kind="stable"
+                )
+            return
+
+        bound = min(buffers[i][key].iloc[-1] for i in live)
+        pieces = []
+        for i, buffer in enumerate(buffers):
+            if buffer is None or buffer.empty:
+                continue
+            cut = np.searchsorted(buffer[key].to_numpy(), bound, side="left")
+            if cut:
+                pieces.append(buffer.iloc[:cut])
+                buffers[i] = buffer.iloc[cut:].reset_index(drop=True)
+        if pieces:
+            yield pd.concat(pieces, ignore_index=True).sort_values(
+                key, kind="stable"
+            )
+
+        # the runs holding back the bound need more rows before it can move
+        for i in live:
+            if buffers[i].empty or buffers[i][key].iloc[-1] == bound:
+                refill(i)
@@ -0,0 +1,247 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# The columns of a downloaded <state>_index.csv
+INDEX_COLUMNS = [
+    "person_nbr",
+    "first_name",
+    "middle_name",
+    "last_name",
+    "suffix",
+    "year_of_birth",
+    "race",
+    "sex",
+    "agency_name",
+    "start_date",
+    "end_date",
+    "separation_reason",
+    "employment_status",
+    "employment_change",
+]
+
+FIRST_NAMES = np.array(
+    ["JOHN", "Maria", "james", "Wei", "Ana", "DeShawn", "Mary-Kate", "O'Neil"]
+)
+MIDDLE_NAMES = np.array(["", "", "A", "lee", "MARIE", "J.", "van"])
+LAST_NAMES = np.array(
+    ["SMITH", "garcia", "Nguyen", "O'BRIEN", "McDonald", "De La Cruz", "Lee"]
+)
+WITHHELD_NAMES = np.array(["WITHHELD", "Name Withheld", "withheld"])
+SUFFIXES = np.array(["", "", "", "", "jr", "SR", "iii", "IV"])
+RACES = np.array(["white", "BLACK", "Hispanic", "asian", "", "unknown"])
+SEXES = np.array(["male", "FEMALE", "M", "f", ""])
+SEPARATION_REASONS = np.array(
+    ["", "resigned", "RETIRED", "terminated", "Deceased", "transfer"]
+)
+EMPLOYMENT_STATUSES = np.array(["active", "INACTIVE", "separated", ""])
+EMPLOYMENT_CHANGES = np.array(["", "hired", "PROMOTED", "reinstated"])
+
+CITIES = [
+    "springfield",
+    "riverside",
+    "fairview",
+    "madison",
+    "georgetown",
+    "clinton",
+    "salem",
+    "greenville",
+    "bristol",
+    "franklin",
+]
+
+
+def agency_pool(rng, size=60):
+    """Agency names written the many ways the real exports write them:
+    "pd"/"so" abbreviations, doubled "office office", odd casing and
+    stray whitespace"""
+    patterns = [
+        "{} pd",
+        "{} PD",
+        "{} police department",
+        "{} Police Department ",
+        "{} co so",
+        "{} county so",
+        "{} county sheriff's office",
+        "{} county sheriff's office office",
+        " {} marshal's office",
+        "{} university pd",
+    ]
+    names = [
+        pattern.format(city)
+        for city in CITIES
+        for pattern in rng.choice(patterns, 6, replace=False)
+    ]
+    names += ["state highway patrol", "Department of Corrections"]
+    return np.array(names[:size])
+
+
+def format_dates(days, rng):
+    """Days since 1970 as date strings, some with the fractional suffixes
+    ("2001-05-03.0") the real files carry"""
+    dates = pd.to_datetime(days, unit="D").strftime("%Y-%m-%d")
+    dates = dates.to_numpy(dtype=object)
+    fractional = rng.random(len(dates)) < 0.05
+    dates[fractional] = dates[fractional] + rng.choice(
+        [".0", ".000", ".5"], fractional.sum()
+    )
+    return dates
+
+
+def make_people_chunk(rng, first_person, npeople, agencies):
+    """Rows for `npeople` people, one per stint. Careers run one to eight
+    stints, at one or several agencies, which follow on from each other,
+    overlap, or leave gaps"""
+    stints = np.minimum(rng.geometric(0.45, npeople), 8)
+    nrows = stints.sum()
+    person = np.repeat(np.arange(npeople), stints)
+    first_of_person = np.r_[0, np.cumsum(stints)[:-1]]
+    stint_number = np.arange(nrows) - np.repeat(first_of_person, stints)
+
+    # careers start between 1970 and 2023; each stint starts some gap
+    # (negative for an overlap, 0-1 days for a contiguous rehire) after the
+    # previous one ended
+    career_start = rng.integers(0, 19_500, npeople)
+    duration = rng.integers(30, 4_000, nrows)
+    gap = np.where(
+        rng.random(nrows) < 0.4,
+        rng.integers(0, 2, nrows),
+        rng.integers(-60, 3_000, nrows),
+    )
+    gap[stint_number == 0] = 0
+    step = np.r_[0, (duration + gap)[:-1]]
+    step[stint_number == 0] = 0
+    offset = np.cumsum(step)
+    offset -= np.repeat(offset[first_of_person], stints)
+    start = career_start[person] + offset
+    end = start + duration
+
+    # most stints stay at the agency of the previous one
+    agency = rng.integers(0, len(agencies), nrows)
+    stay = (rng.random(nrows) < 0.5) & (stint_number > 0)
+    for _ in range(stints.max()):
+        agency = np.where(stay, np.r_[agency[0], agency[:-1]], agency)
+
+    start_date = format_dates(start, rng)
+    end_date = format_dates(end, rng)
+    # still employed: an empty end date, or "nan" as some exports write it
+    last_stint = np.r_[first_of_person[1:], nrows] - 1
+    active = np.zeros(nrows, dtype=bool)
+    active[last_stint] = rng.random(npeople) < 0.35
+    end_date[active] = rng.choice(["", "nan"], active.sum())
+    # typos that put years out of range
+    bad = rng.random(nrows)
+    start_date[bad < 0.003] = "0201-06-01"
+    end_date[(bad >= 0.003) & (bad < 0.006)] = "2999-12-31"
+    start_date[(bad >= 0.006) & (bad < 0.008)] = "1776-07-04"
+    start_date[(bad >= 0.008) & (bad < 0.009)] = ""
+
+    last_name = LAST_NAMES[rng.integers(0, len(LAST_NAMES), npeople)]
+    withheld = rng.random(npeople) < 0.01
+    last_name[withheld] = rng.choice(WITHHELD_NAMES, withheld.sum())
+    year_of_birth = rng.integers(1940, 2003, npeople).astype(str).astype(object)
+    year_of_birth[rng.random(npeople) < 0.1] = ""
+
+    def per_person(values):
+        return values[rng.integers(0, len(values), npeople)][person]
+
+    def per_stint(values):
+        return values[rng.integers(0, len(values), nrows)]
+
+    return pd.DataFrame(
+        {
+            "person_nbr": (first_person + person).astype(str),
+            "first_name": per_person(FIRST_NAMES),
+            "middle_name": per_person(MIDDLE_NAMES),
+            "last_name": last_name[person],
+            "suffix": per_person(SUFFIXES),
+            "year_of_birth": year_of_birth[person],
+            "race": per_person(RACES),
+            "sex": per_person(SEXES),
+            "agency_name": agencies[agency],
+            "start_date": start_date,
+            "end_date": end_date,
+            "separation_reason": per_stint(SEPARATION_REASONS),
+            "employment_status": per_stint(EMPLOYMENT_STATUSES),
+            "employment_change": per_stint(EMPLOYMENT_CHANGES),
+        },
+        columns=INDEX_COLUMNS,
+    )
+
+
+def write_state_index(path, rows, seed=0, chunk_people=200_000):
+    """Write a synthetic <state>_index.csv of `rows` rows, chunk by chunk so
+    that even 20M rows fit in memory"""
+    rng = np.random.default_rng(seed)
+    agencies = agency_pool(rng)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    written = 0
+    first_person = 0
+    with open(tmp_path, "w", newline="") as f:
+        while written < rows:
+            chunk = make_people_chunk(rng, first_person, chunk_people, agencies)
+            chunk = chunk.iloc[: rows - written]
+            chunk.to_csv(f, index=False, header=written == 0)
+            written += len(chunk)
+            first_person += chunk_people
+    os.replace(tmp_path, path)
+    return written
+
+
+def parse_rows(value):
+    """Row counts like 10000, 10k or 20M"""
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    value = value.strip().lower()
+    if value[-1] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic <state>_index.csv files to run and "
+        "benchmark the preprocess step on"
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        default="data/synthetic/input",
+        help="Where to write <state>/<state>_index.csv "
+        "(default: data/synthetic/input)",
+    )
+    parser.add_argument(
+        "--states",
+        type=str,
+        nargs="+",
+        default=["california", "florida", "ohio"],
+        help="State names to generate (default: california florida ohio)",
+    )
+    parser.add_argument(
+        "--rows",
+        type=parse_rows,
+        default=parse_rows("100k"),
+        help="Rows per state, e.g. 10k or 20M (default: 100k)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed; the same seed gives the same files (default: 0)",
+    )
+    args = parser.parse_args()
+
+    for i, state_name in enumerate(args.states):
+        path = os.path.join(
+            args.output_dir, state_name, f"{state_name}_index.csv"
+        )
+        rows = write_state_index(path, args.rows, seed=args.seed + i)
+        size_mb = os.path.getsize(path) / 2**20
+        print(f"Wrote {rows} rows to {path} ({size_mb:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "common"))
+from file_hash import sha256_file
+
+
+# Each output file has its own manifest next to it, so the csv and parquet
+# outputs of a state are tracked separately and switching formats doesn't
+# rebuild one that is still up to date
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def hash_transformation(source_files, config):
+    """sha256 of the code that does the transformation plus the settings it
+    was run with, so a change to either triggers a rebuild"""
+    digest = hashlib.sha256()
+    for file_path in sorted(source_files):
+        with open(file_path, "rb") as f:
+            digest.update(f.read())
+    digest.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def manifest_path(output_file_path):
+    return output_file_path + MANIFEST_SUFFIX
+
+
+def read_manifest(output_file_path):
+    path = manifest_path(output_file_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(output_file_path, entry):
+    path = manifest_path(output_file_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(entry, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def rebuild_reason(entry, input_hash, transformation_hash, output_file_path):
+    """Why a state needs rebuilding, or None when its output is up to date"""
+    if entry is None:
+        return "no manifest entry"
+    if not os.path.exists(output_file_path):
+        return "output missing"
+    if entry.get("output_file") != os.path.basename(output_file_path):
+        return "output format changed"
+    if entry.get("input_hash") != input_hash:
+        return "input changed"
+    if entry.get("transformation_hash") != transformation_hash:
+        return "transformation changed"
+    if entry.get("output_hash") != sha256_file(output_file_path):
+        return "output modified"
+    return None
@@ -1,10 +1,91 @@
 import argparse
+import contextlib
 import datetime
 import gzip
+import io
+import json
 import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from external_sort import merge_sorted_runs, write_sorted_run
+from manifest import (
+    hash_transformation,
+    read_manifest,
+    rebuild_reason,
+    write_manifest,
+)
+
+
+COMMON_DIR = Path(__file__).resolve().parents[3] / "common"
+sys.path.insert(0, str(COMMON_DIR))
+from agency_names import canonicalize_agency_names
+from file_hash import sha256_file
+
+
+# Source files that make up the transformation, hashed into the manifest so
+# that code changes trigger a rebuild
+TRANSFORMATION_SOURCES = [
+    os.path.abspath(__file__),
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "external_sort.py"
+    ),
+    str(COMMON_DIR / "agency_names.py"),
+]
+
+
+# Low-cardinality columns kept as categoricals through the pipeline, so the
+# string transformations run once per category rather than once per row
+CATEGORICAL_COLUMNS = [
+    "agency_name",
+    "race",
+    "sex",
+    "separation_reason",
+    "employment_status",
+    "employment_change",
+]
+
+
+def to_categoricals(df):
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def map_values(values, func):
+    """Apply a vectorized string function to a column. Categorical columns are
+    transformed once per category and stay categorical: categories that end
+    up equal are merged, and the categories are kept sorted so that sorting
+    the column orders it the same way as plain strings
+    """
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        return func(values)
+    codes = values.cat.codes.to_numpy()
+    categories = pd.Series(values.cat.categories, dtype=object)
+    if (codes < 0).any():
+        # missing values get a category of their own, so func sees them too
+        codes = np.where(codes < 0, len(categories), codes)
+        categories = pd.concat(
+            [categories, pd.Series([np.nan], dtype=object)], ignore_index=True
+        )
+    new_codes, new_categories = pd.factorize(func(categories), sort=True)
+    return pd.Series(
+        pd.Categorical.from_codes(new_codes[codes], categories=new_categories),
+        index=values.index,
+        name=values.name,
+    )
+
+
+def lower_strip(values):
+    return values.fillna("").astype(str).str.lower().str.strip()
 
 
 def case_cols(df):
@@ -27,7 +108,7 @@ def case_cols(df):
 
     for col in columns_to_transform:
         if col in df.columns:
-            df[col] = df[col].fillna("").astype(str).str.lower().str.strip()
+            df[col] = map_values(df[col], lower_strip)
         else:
             print(
                 f"Column '{col}' not found. Skipping transformation for this column."
@@ -56,71 +137,68 @@ def clean_dates(df):
 
 
 def clean_agency_names(df):
-    df.loc[:, "agency_name"] = (
-        df.agency_name.str.lower()
-        .str.strip()
-        .str.replace(r"office office$", "office", regex=True)
-        .str.replace(r"\bso$", "sheriff's office", regex=True)
-        .str.replace(r"\bpd$", "police department", regex=True)
-    )
+    df["agency_name"] = map_values(df.agency_name, canonicalize_agency_names)
     return df
 
 
-def apply_proper_casing(df):
-    def proper_case(text):
-        # Split the text into words
-        words = text.split()
-        # Process each word
-        processed_words = []
-        for word in words:
-            # Special handling for Sheriff's
-            if word.lower() == "sheriff's":
-                processed_words.append("Sheriff's")
-            # Special handling for suffixes and roman numerals
-            elif word.upper() in [
-                "I",
-                "II",
-                "III",
-                "IV",
-                "V",
-                "VI",
-                "VII",
-                "VIII",
-                "IX",
-                "X",
-                "JR",
-                "SR",
-            ]:
-                if word.upper() in ["JR", "SR"]:
-                    processed_words.append(word.capitalize())
-                else:
-                    processed_words.append(word.upper())
-            # Special handling for abbreviations like 'PD' for Police Department
-            elif word.upper() in ["PD", "SO", "DA", "UC"]:
-                processed_words.append(word.upper())
-            # General case: capitalize first letter, lowercase the rest
-            else:
-                processed_words.append(word.capitalize())
-        return " ".join(processed_words)
+ROMAN_NUMERALS = {"I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X"}
+NAME_SUFFIXES = {"JR", "SR"}
+ABBREVIATIONS = {"PD", "SO", "DA", "UC"}
+
+PROPER_CASE_COLUMNS = [
+    "first_name",
+    "last_name",
+    "middle_name",
+    "agency_name",
+    "separation_reason",
+    "employment_status",
+    "employment_change",
+    "race",
+    "sex",
+    "suffix",
+]
+
+
+def proper_case(text):
+    # Split the text into words
+    words = text.split()
+    # Process each word
+    processed_words = []
+    for word in words:
+        upper = word.upper()
+        # Special handling for Sheriff's
+        if word.lower() == "sheriff's":
+            processed_words.append("Sheriff's")
+        # Special handling for suffixes
+        elif upper in NAME_SUFFIXES:
+            processed_words.append(word.capitalize())
+        # Special handling for roman numerals and abbreviations like 'PD' for
+        # Police Department
+        elif upper in ROMAN_NUMERALS or upper in ABBREVIATIONS:
+            processed_words.append(upper)
+        # General case: capitalize first letter, lowercase the rest
+        else:
+            processed_words.append(word.capitalize())
+    return " ".join(processed_words)
 
-    columns_to_transform = [
-        "first_name",
-        "last_name",
-        "middle_name",
-        "agency_name",
-        "separation_reason",
-        "employment_status",
-        "employment_change",
-        "race",
-        "sex",
-        "suffix",
-    ]
 
-    for col in columns_to_transform:
+def proper_case_values(values):
+    """Proper case a column, running `proper_case` once per distinct value
+    and mapping the results back onto the rows through the factorized codes.
+    Missing values are left as they are
+    """
+    codes, uniques = pd.factorize(values)
+    cased = np.array([proper_case(str(x)) for x in uniques], dtype=object)
+    out = np.asarray(values, dtype=object).copy()
+    present = codes >= 0
+    out[present] = cased[codes[present]]
+    return out
+
+
+def apply_proper_casing(df):
+    for col in PROPER_CASE_COLUMNS:
         if col in df.columns:
-            df[col] = df[col].apply(
-                lambda x: proper_case(str(x)) if pd.notna(x) else x
-            )
+            df[col] = map_values(df[col], proper_case_values)
         else:
             print(
                 f"Column '{col}' not found. Skipping proper casing for this column."
@@ -186,42 +264,89 @@ def clean_date(date_str: str):
         return None
 
 
-def collapse_contiguous_stints(df: pd.DataFrame, by_cols: list) -> pd.DataFrame:
+def clean_date_values(values):
+    """`clean_date` run once per distinct value and mapped back onto the rows"""
+    codes, uniques = pd.factorize(values)
+    cleaned = np.array([clean_date(x) for x in uniques] + [None], dtype=object)
+    return cleaned[codes]
+
+
+def collapse_contiguous_stints(df: pd.DataFrame, by_cols=None) -> pd.DataFrame:
+    """Collapse rows for the same person and agency whose dates overlap or
+    are contiguous into a single stint. The stint keeps the earliest start
+    date, the latest end date, and the remaining columns from its last row.
+
+    Works on arrays after a single sort: stint boundaries come from comparing
+    each row with the one before it, and the per-stint reductions use the
+    boundary positions rather than a python-level groupby aggregate
+    """
     if not by_cols:
         by_cols = ["person_nbr", "first_name", "last_name", "agency_name"]
+    start_time = time.time()
+    rows_in = len(df)
     # assume missing end dates are current employment, and use today's date for
     # sorting purposes
-    # assert df.start_date.notna().all()
     one_day = pd.to_timedelta(1, "days")
     today = pd.to_datetime(datetime.date.today(), utc=False)
     ancient = pd.to_datetime("1800-01-01", utc=False)
-    working = df.sort_values(
-        ["person_nbr", "agency_name", "start_date"], inplace=False
-    )
-    working["start_date"] = working["start_date"].apply(clean_date)
-    working["end_date"] = working["end_date"].apply(clean_date)
-    working["start_date"] = pd.to_datetime(
-        working.start_date, utc=False
+
+    # rows are ordered by the stint keys, and within a set of keys by
+    # person/agency/start date (as text) -- a stable sort keeps ties in their
+    # original order
+    sort_cols = by_cols + [
+        col
+        for col in ["person_nbr", "agency_name", "start_date"]
+        if col not in by_cols
+    ]
+    working = df.dropna(subset=by_cols).sort_values(sort_cols, kind="stable")
+    nrows = len(working)
+
+    start_date = pd.to_datetime(
+        pd.Series(clean_date_values(working.start_date)), utc=False
     ).fillna(ancient)
-    working["end_date"] = pd.to_datetime(working.end_date, utc=False).fillna(
-        today
-    )
-    working.loc[working.start_date < ancient, "start_date"] = ancient
-    working.loc[working.end_date > today, "end_date"] = today
-    grouped = working.groupby(by_cols)
-    working["prv_end"] = grouped["end_date"].shift(1, fill_value=today)
-    working["new_stint"] = (working.start_date - working.prv_end) > one_day
-    working["stint_id"] = grouped["new_stint"].cumsum()
-    collapsible = working.groupby(by_cols + ["stint_id"])
-    summaries = {k: lambda x: x.tail(1) for k in df.columns if k not in by_cols}
-    summaries["start_date"] = "min"
-    summaries["end_date"] = "max"
-    out = collapsible.aggregate(summaries).reset_index()
-    out["start_date"] = out["start_date"].dt.strftime("%Y-%m-%d")
-    out["end_date"] = out["end_date"].dt.strftime("%Y-%m-%d")
+    end_date = pd.to_datetime(
+        pd.Series(clean_date_values(working.end_date)), utc=False
+    ).fillna(today)
+    start_date = start_date.where(start_date >= ancient, ancient).to_numpy()
+    end_date = end_date.where(end_date <= today, today).to_numpy()
+
+    keys = working[by_cols].reset_index(drop=True)
+    new_group = np.ones(nrows, dtype=bool)
+    if nrows:
+        new_group[1:] = (
+            keys.iloc[1:].to_numpy() != keys.iloc[:-1].to_numpy()
+        ).any(axis=1)
+
+    # the first row of each group always starts a stint, so whatever wraps
+    # around into prv_end there is never used
+    prv_end = np.roll(end_date, 1)
+    new_stint = new_group | ((start_date - prv_end) > one_day.to_timedelta64())
+
+    stint_starts = np.flatnonzero(new_stint)
+    stint_ends = np.append(stint_starts[1:], nrows)[: len(stint_starts)] - 1
+
+    out = working.iloc[stint_ends][
+        by_cols + [col for col in df.columns if col not in by_cols]
+    ].reset_index(drop=True)
+    if nrows:
+        out["start_date"] = pd.Series(
+            np.minimum.reduceat(start_date, stint_starts)
+        ).dt.strftime("%Y-%m-%d")
+        out["end_date"] = pd.Series(
+            np.maximum.reduceat(end_date, stint_starts)
+        ).dt.strftime("%Y-%m-%d")
     out.loc[out.end_date == today.strftime("%Y-%m-%d"), "end_date"] = None
     out.loc[out.start_date == ancient.strftime("%Y-%m-%d"), "start_date"] = None
-    return out.drop(["stint_id"], axis=1, inplace=False)
+
+    print(
+        f"Collapsed stints: {rows_in} rows in, {len(out)} rows out "
+        f"({time.time() - start_time:.2f} seconds)"
+    )
+    return out
+
+
+# States whose contiguous stints are collapsed by default
+COLLAPSE_STATES = {"california"}
 
 
 def filter_anons(df: pd.DataFrame) -> pd.DataFrame:
@@ -231,14 +356,22 @@ def filter_anons(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def sort_by_uid(df):
+    # a stable sort of the text ids, so rows keep their input order within a
+    # person and the streaming merge can give the same order. Upload doc ids
+    # are row positions, so changing this order moves documents
     if "person_nbr" in df.columns:
-        df = df.sort_values("person_nbr")
+        df = df.sort_values("person_nbr", kind="stable")
     return df
 
 
-def apply_transformations(df, state_name):
-    """Apply transformations based on state and available columns"""
-    df = (
+def should_collapse(state_name, collapse_states):
+    return "all" in collapse_states or state_name.lower() in collapse_states
+
+
+def apply_row_transformations(df):
+    """The transformations that only look at one row at a time, and so can be
+    run on any chunk of the data"""
+    return (
         df.pipe(case_cols)
         .pipe(clean_column_names)
         .pipe(clean_dates)
@@ -247,55 +380,330 @@ def apply_transformations(df, state_name):
         .pipe(apply_proper_casing)
         .pipe(filter_anons)
         .pipe(check_required_columns)
-        .pipe(sort_by_uid)
     )
 
-    # Only apply collapse_contiguous_stints for California
-    if state_name.lower() == "california":
+
+def apply_transformations(df, state_name, collapse_states=COLLAPSE_STATES):
+    """Apply transformations based on state and available columns"""
+    df = df.pipe(apply_row_transformations).pipe(sort_by_uid)
+
+    # Only apply collapse_contiguous_stints for the requested states
+    if should_collapse(state_name, collapse_states):
         df = df.pipe(collapse_contiguous_stints)
 
     return df
 
 
-def process_state_data(state_name, input_dir, output_dir, force=False):
+def write_csv_gz(df, output_file_path):
+    """Write df as gzipped csv. Goes through a temp file so an interrupted
+    worker never leaves a partial output behind, and pins the gzip header
+    timestamp so identical data always gives byte-identical files
     """
-    Process state data and prepare it for Firestore upload with optimized document IDs
+    tmp_file_path = output_file_path + ".tmp"
+    with (
+        open(tmp_file_path, "wb") as raw_file,
+        gzip.GzipFile(filename="", mode="wb", fileobj=raw_file, mtime=0) as gz,
+        io.TextIOWrapper(gz, encoding="utf-8") as gz_file,
+    ):
+        df.to_csv(gz_file, index=False)
+    os.replace(tmp_file_path, output_file_path)
+
+
+def write_parquet(df, output_file_path):
+    """Write df as parquet through a temp file. Strings are dictionary encoded
+    (the pyarrow default), which suits the many repeated agency/race/sex
+    values
     """
-    # Create state-specific output directory
-    state_output_dir = os.path.join(output_dir, state_name)
-    os.makedirs(state_output_dir, exist_ok=True)
+    tmp_file_path = output_file_path + ".tmp"
+    df.to_parquet(
+        tmp_file_path,
+        engine="pyarrow",
+        index=False,
+        compression="zstd",
+        use_dictionary=True,
+    )
+    os.replace(tmp_file_path, output_file_path)
+
+
+# File extensions for the stage handoff formats
+INPUT_EXTENSIONS = {"csv": ".csv", "parquet": ".parquet"}
+OUTPUT_EXTENSIONS = {"csv": ".csv.gz", "parquet": ".parquet"}
 
-    input_file_path = os.path.join(
-        input_dir, state_name, f"{state_name}_index.csv"
+
+def get_input_file_path(input_dir, state_name, input_format="csv"):
+    return os.path.join(
+        input_dir,
+        state_name,
+        f"{state_name}_index{INPUT_EXTENSIONS[input_format]}",
     )
-    output_file_path = os.path.join(
-        state_output_dir, f"{state_name}-processed.csv.gz"
+
+
+def get_output_file_path(output_dir, state_name, output_format="csv"):
+    return os.path.join(
+        output_dir,
+        state_name,
+        f"{state_name}-processed{OUTPUT_EXTENSIONS[output_format]}",
     )
 
-    # Check if output file already exists
-    if os.path.exists(output_file_path) and not force:
-        print(f"Skipping {state_name} - output file already exists")
-        return "skipped"
 
-    try:
-        df = pd.read_csv(input_file_path)
-        df = apply_transformations(df, state_name)
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
 
-        # Add state field - using simple string replace
-        formatted_state = state_name.lower().replace(" ", "-")
-        df["state"] = formatted_state
 
-        # Ensure person_nbr is string and pad with zeros
-        df["person_nbr"] = df["person_nbr"].astype(str)
+def read_state_data(input_file_path):
+    """Read a whole input file. csv is read as text, as iter_state_chunks
+    reads it, so both modes write the same values"""
+    if input_file_path.endswith(".parquet"):
+        df = pd.read_parquet(input_file_path)
+    else:
+        df = pd.read_csv(input_file_path, dtype=str)
+    before = memory_mb(df)
+    df = to_categoricals(df)
+    print(
+        f"Memory footprint: {before:.1f} MB as read, "
+        f"{memory_mb(df):.1f} MB with categoricals"
+    )
+    return df
+
 
-        # Create document_id field
-        df["document_id"] = df["state"] + "_" + df["person_nbr"]
+def write_state_data(df, output_file_path):
+    if output_file_path.endswith(".parquet"):
+        write_parquet(df, output_file_path)
+    else:
+        write_csv_gz(df, output_file_path)
+
+
+def add_state_fields(df, state_name):
+    # Add state field - using simple string replace, stored as a single
+    # category rather than a copy of the string per row
+    formatted_state = state_name.lower().replace(" ", "-")
+    df["state"] = pd.Categorical.from_codes(
+        np.zeros(len(df), dtype=np.int8), categories=[formatted_state]
+    )
+
+    # person_nbr is read as text and used verbatim, so zero-padded ids keep
+    # their zeros ("007" gives "<state>_007") and a blank is "nan"; before
+    # the input was read as text, "007" gave "<state>_7"
+    df["person_nbr"] = df["person_nbr"].astype(str)
+
+    # Create document_id field
+    df["document_id"] = formatted_state + "_" + df["person_nbr"]
+    return df
+
+
+def process_state_in_memory(
+    input_file_path, output_file_path, state_name, collapse_states
+):
+    df = read_state_data(input_file_path)
+    df = apply_transformations(df, state_name, collapse_states)
+    df = add_state_fields(df, state_name)
+    write_state_data(df, output_file_path)
+
+
+# Rough ratio of peak memory to the size of a chunk as read: the row-local
+# transforms hold a few copies of it, and the merge holds a chunk's worth of
+# buffers
+CHUNK_MEMORY_OVERHEAD = 8
+
+
+def iter_state_chunks(input_file_path, chunk_rows):
+    """Read an input file chunk_rows at a time. csv is read as text so every
+    chunk sees the same column types"""
+    if input_file_path.endswith(".parquet"):
+        parquet_file = pq.ParquetFile(input_file_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+            yield to_categoricals(batch.to_pandas())
+    else:
+        for chunk in pd.read_csv(
+            input_file_path, dtype=str, chunksize=chunk_rows
+        ):
+            yield to_categoricals(chunk)
+
+
+def estimate_chunk_rows(input_file_path, max_memory_mb, sample_rows=10_000):
+    """Pick a chunk size that keeps peak memory under max_memory_mb, based on
+    the in-memory size of the first sample_rows rows"""
+    sample = next(iter_state_chunks(input_file_path, sample_rows), None)
+    if sample is None or sample.empty:
+        return sample_rows
+    bytes_per_row = sample.memory_usage(deep=True).sum() / len(sample)
+    budget = max_memory_mb * 2**20 / CHUNK_MEMORY_OVERHEAD
+    return max(1_000, int(budget / bytes_per_row))
+
+
+class StateWriter:
+    """Appends DataFrames to a csv.gz or parquet output through a temp file,
+    which replaces the output once everything is written"""
+
+    def __init__(self, output_file_path):
+        self.output_file_path = output_file_path
+        self.tmp_file_path = output_file_path + ".tmp"
+        self.parquet = output_file_path.endswith(".parquet")
+        self.columns = None
+        self.stack = contextlib.ExitStack()
+        if self.parquet:
+            self.writer = None
+        else:
+            raw_file = self.stack.enter_context(open(self.tmp_file_path, "wb"))
+            gz = self.stack.enter_context(
+                gzip.GzipFile(filename="", mode="wb", fileobj=raw_file, mtime=0)
+            )
+            self.writer = self.stack.enter_context(
+                io.TextIOWrapper(gz, encoding="utf-8")
+            )
+
+    def write(self, df):
+        header = self.columns is None
+        if header:
+            self.columns = list(df.columns)
+        df = df[self.columns]
+        if not self.parquet:
+            df.to_csv(self.writer, index=False, header=header)
+            return
+        # chunks can disagree on types (a column that is all missing in one
+        # chunk), so streamed parquet stores every column as text
+        schema = pa.schema([(col, pa.string()) for col in self.columns])
+        if self.writer is None:
+            self.writer = self.stack.enter_context(
+                pq.ParquetWriter(
+                    self.tmp_file_path,
+                    schema,
+                    compression="zstd",
+                    use_dictionary=True,
+                )
+            )
+        self.writer.write_table(
+            pa.Table.from_pandas(
+                df.astype("string"), schema=schema, preserve_index=False
+            )
+        )
+
+    def close(self):
+        if self.columns is None:
+            raise ValueError("No rows left to write after transformations")
+        self.stack.close()
+        os.replace(self.tmp_file_path, self.output_file_path)
+
+
+def process_state_streaming(
+    input_file_path,
+    output_file_path,
+    state_name,
+    collapse_states,
+    max_memory_mb,
+):
+    """Process a state in bounded memory. The row-local transformations run
+    chunk by chunk and each chunk is spilled to disk as a sorted run. The runs
+    are merged back in person_nbr order, which keeps every person's rows
+    together so stints can be collapsed piece by piece as the output is
+    written. The output is the same as process_state_in_memory gives"""
+    chunk_rows = estimate_chunk_rows(input_file_path, max_memory_mb)
+    print(
+        f"Streaming {state_name} in chunks of {chunk_rows} rows "
+        f"({max_memory_mb} MB ceiling)"
+    )
+    state_output_dir = os.path.dirname(output_file_path)
+    seen_messages = set()
+    with tempfile.TemporaryDirectory(dir=state_output_dir) as run_dir:
+        run_paths = []
+        for run_number, chunk in enumerate(
+            iter_state_chunks(input_file_path, chunk_rows)
+        ):
+            # the transformations print the same column warnings for every
+            # chunk, so only pass on the ones we haven't seen yet
+            messages = io.StringIO()
+            with contextlib.redirect_stdout(messages):
+                chunk = apply_row_transformations(chunk)
+            for line in messages.getvalue().splitlines():
+                if line not in seen_messages:
+                    seen_messages.add(line)
+                    print(line)
+            run_paths.append(
+                write_sorted_run(chunk, "person_nbr", run_dir, run_number)
+            )
+        print(f"Wrote {len(run_paths)} sorted runs for {state_name}")
+
+        writer = StateWriter(output_file_path)
+        batch_rows = max(1_000, chunk_rows // max(1, len(run_paths)))
+        for piece in merge_sorted_runs(run_paths, "person_nbr", batch_rows):
+            if should_collapse(state_name, collapse_states):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    piece = collapse_contiguous_stints(piece)
+            writer.write(add_state_fields(piece, state_name))
+        writer.close()
+
+
+def process_state_data(
+    state_name,
+    input_dir,
+    output_dir,
+    force=False,
+    collapse_states=COLLAPSE_STATES,
+    input_format="csv",
+    output_format="csv",
+    max_memory_mb=None,
+):
+    """
+    Process state data and prepare it for Firestore upload with optimized document IDs
+    """
+    # Create state-specific output directory
+    state_output_dir = os.path.join(output_dir, state_name)
+    os.makedirs(state_output_dir, exist_ok=True)
+
+    input_file_path = get_input_file_path(input_dir, state_name, input_format)
+    output_file_path = get_output_file_path(
+        output_dir, state_name, output_format
+    )
+
+    try:
+        # Skip states whose input, transformation and output all match the
+        # manifest from the last run
+        input_hash = sha256_file(input_file_path)
+        transformation_hash = hash_transformation(
+            TRANSFORMATION_SOURCES,
+            {
+                "collapse_stints": should_collapse(state_name, collapse_states),
+                "streaming": bool(max_memory_mb),
+            },
+        )
+        if not force:
+            reason = rebuild_reason(
+                read_manifest(output_file_path),
+                input_hash,
+                transformation_hash,
+                output_file_path,
+            )
+            if reason is None:
+                print(f"Skipping {state_name} - output is up to date")
+                return "skipped"
+            print(f"Rebuilding {state_name} - {reason}")
 
         # Ensure output directory exists
         os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
 
-        with gzip.open(output_file_path, "wt", encoding="utf-8") as gz_file:
-            df.to_csv(gz_file, index=False)
+        if max_memory_mb:
+            process_state_streaming(
+                input_file_path,
+                output_file_path,
+                state_name,
+                collapse_states,
+                max_memory_mb,
+            )
+        else:
+            process_state_in_memory(
+                input_file_path, output_file_path, state_name, collapse_states
+            )
+        write_manifest(
+            output_file_path,
+            {
+                "state": state_name,
+                "input_file": os.path.basename(input_file_path),
+                "input_hash": input_hash,
+                "transformation_hash": transformation_hash,
+                "output_file": os.path.basename(output_file_path),
+                "output_hash": sha256_file(output_file_path),
+            },
+        )
 
         print(f"Successfully processed {state_name}")
         return "success"
@@ -304,6 +712,77 @@ def process_state_data(state_name, input_dir, output_dir, force=False):
         return "failed"
 
 
+def read_updated_states(report_path):
+    """The states the download step fetched anew or found changed, from the
+    download-report.json it writes"""
+    with open(report_path) as f:
+        return set(json.load(f)["updated"])
+
+
+def order_states_by_input_size(state_dirs, input_dir, input_format="csv"):
+    """Order states largest input first, so the slowest states start first
+    when running in parallel. Ties are broken by name to keep the order stable
+    """
+
+    def input_size(state):
+        path = get_input_file_path(input_dir, state, input_format)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    return sorted(state_dirs, key=lambda state: (-input_size(state), state))
+
+
+def run_states(
+    states,
+    input_dir,
+    output_dir,
+    force=False,
+    workers=1,
+    collapse_states=COLLAPSE_STATES,
+    input_format="csv",
+    output_format="csv",
+    max_memory_mb=None,
+    updated_states=(),
+):
+    """Process each state, fanning out to a process pool when workers > 1.
+    States in `updated_states` are rebuilt without checking the manifest.
+    Returns a dict of state name -> result ("success", "skipped", "failed")
+    """
+
+    def state_args(state):
+        return (
+            state,
+            input_dir,
+            output_dir,
+            force or state in updated_states,
+            collapse_states,
+            input_format,
+            output_format,
+            max_memory_mb,
+        )
+
+    if workers <= 1:
+        return {
+            state: process_state_data(*state_args(state)) for state in states
+        }
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(process_state_data, *state_args(state)): state
+            for state in states
+        }
+        for future in as_completed(futures):
+            state = futures[future]
+            try:
+                results[state] = future.result()
+            except Exception as e:
+                # process_state_data catches its own errors, so this is a
+                # worker that died outright (e.g. killed for memory)
+                print(f"Error processing {state}: worker failed: {str(e)}")
+                results[state] = "failed"
+    return results
+
+
 def main():
     parser = argparse.ArgumentParser(description="Process state data files")
     parser.add_argument(
@@ -321,7 +800,46 @@ def main():
     parser.add_argument(
         "--force",
         action="store_true",
-        help="Force reprocessing of files even if output exists",
+        help="Force reprocessing of files even if output is up to date",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of states to process in parallel (default: 1)",
+    )
+    parser.add_argument(
+        "--collapse-states",
+        type=str,
+        nargs="+",
+        default=sorted(COLLAPSE_STATES),
+        help="States whose contiguous stints are collapsed, or 'all' "
+        "(default: california)",
+    )
+    parser.add_argument(
+        "--input-format",
+        choices=sorted(INPUT_EXTENSIONS),
+        default="csv",
+        help="Format of the downloaded <state>_index files (default: csv)",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=sorted(OUTPUT_EXTENSIONS),
+        default="csv",
+        help="Format of the processed files: gzipped csv or parquet with "
+        "dictionary-encoded strings (default: csv)",
+    )
+    parser.add_argument(
+        "--max-memory-mb",
+        type=int,
+        help="Stream each state in chunks sized to stay under this much "
+        "memory (per worker), instead of loading it whole",
+    )
+    parser.add_argument(
+        "--download-report",
+        type=str,
+        help="Rebuild the states this download-report.json lists as updated "
+        "without checking their manifests; the rest are checked as usual",
     )
     args = parser.parse_args()
 
@@ -341,10 +859,37 @@ def main():
 
     print(f"Found {len(state_dirs)} state directories to process")
 
-    for state in state_dirs:
-        result = process_state_data(
-            state, args.input_dir, args.output_dir, args.force
+    # The report only covers the last download, so it can't say which
+    # states are up to date; a state changed by an earlier download is still
+    # caught by its manifest
+    updated_states = set()
+    if args.download_report and not args.force:
+        updated_states = read_updated_states(args.download_report) & set(
+            state_dirs
         )
+        print(
+            f"{len(updated_states)} of them updated by the last download, per "
+            f"{args.download_report}"
+        )
+
+    state_dirs = order_states_by_input_size(
+        state_dirs, args.input_dir, args.input_format
+    )
+    results = run_states(
+        state_dirs,
+        args.input_dir,
+        args.output_dir,
+        force=args.force,
+        workers=args.workers,
+        collapse_states={state.lower() for state in args.collapse_states},
+        input_format=args.input_format,
+        output_format=args.output_format,
+        max_memory_mb=args.max_memory_mb,
+        updated_states=updated_states,
+    )
+
+    for state in state_dirs:
+        result = results[state]
         if result == "success":
             successful_states.append(state)
         elif result == "skipped":
@@ -354,7 +899,7 @@ def main():
 
     print("\nProcessing complete!")
     print(f"Successfully processed: {len(successful_states)} states")
-    print(f"Skipped (already processed): {len(skipped_states)} states")
+    print(f"Skipped (up to date): {len(skipped_states)} states")
     print(f"Errors encountered: {len(failed_states)} states")
 
     if skipped_states:
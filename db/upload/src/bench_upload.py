@@ -0,0 +1,237 @@
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import src as upload
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "common"))
+from rate_control import RateController
+from storage import FirestoreEmulatorBackend, SQLiteBackend
+
+
+AGENCIES = [
+    "springfield police department",
+    "shelby county sheriff's office",
+    "state highway patrol",
+    "riverside police department",
+    "department of corrections",
+]
+STATUSES = ["active", "separated", "retired", "terminated"]
+
+
+def make_state_file(path, state_name, rows, padding=0, seed=0):
+    """Write a synthetic processed state file shaped like the real ones"""
+    rng = np.random.default_rng(seed)
+    person = rng.integers(0, max(1, rows // 3), rows)
+    start = pd.to_datetime("1980-01-01") + pd.to_timedelta(
+        rng.integers(0, 15000, rows), "D"
+    )
+    end = start + pd.to_timedelta(rng.integers(30, 4000, rows), "D")
+    end_date = end.strftime("%Y-%m-%d").to_numpy(dtype=object)
+    end_date[rng.random(rows) < 0.3] = ""
+    df = pd.DataFrame(
+        {
+            "person_nbr": person.astype(str),
+            "first_name": rng.choice(["John", "Maria", "Wei", "Ana"], rows),
+            "last_name": rng.choice(["Smith", "Garcia", "Nguyen", "Lee"], rows),
+            "middle_name": "",
+            "suffix": "",
+            "agency_name": rng.choice(AGENCIES, rows),
+            "start_date": start.strftime("%Y-%m-%d"),
+            "end_date": end_date,
+            "separation_reason": "",
+            "employment_status": rng.choice(STATUSES, rows),
+            "race": "",
+            "sex": rng.choice(["male", "female"], rows),
+            "year_of_birth": rng.integers(1940, 2000, rows).astype(str),
+            "state": state_name,
+        }
+    )
+    df["document_id"] = state_name + "_" + df["person_nbr"]
+    if padding:
+        # free text to make the documents bigger
+        df["notes"] = "x" * padding
+    df = df.sort_values("person_nbr", kind="stable")
+    df.to_csv(path, index=False, compression={"method": "gzip", "mtime": 0})
+
+
+class RecordingController(RateController):
+    """Rate controller that keeps every commit latency it's told about"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    def record_success(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+        super().record_success(latency)
+
+
+def run_case(backend, files, batch_size, concurrency, rate, work_dir):
+    """Upload every file once into an emptied backend"""
+    backend.reset()
+    upload.storage = backend
+    controller = RecordingController(initial_rate=rate, max_rate=rate)
+    docs = 0
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        manifest = upload.load_manifest()
+        for state_name, path in files:
+            uploaded, _ = upload.upload_csv_gz_to_firestore(
+                path,
+                state_name,
+                batch_size=batch_size,
+                concurrency=concurrency,
+                controller=controller,
+                journal_dir=os.path.join(work_dir, "journal"),
+                snapshot_dir=os.path.join(work_dir, "snapshots"),
+                manifest=manifest,
+            )
+            docs += uploaded
+    seconds = time.perf_counter() - start
+    latencies = np.array(controller.latencies) * 1000
+    return {
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "docs": docs,
+        "seconds": round(seconds, 2),
+        "docs_per_second": round(docs / seconds, 1),
+        "p50_commit_ms": round(float(np.percentile(latencies, 50)), 1),
+        "p99_commit_ms": round(float(np.percentile(latencies, 99)), 1),
+        "retries": controller.retries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the uploader across batch sizes and concurrency "
+        "levels on synthetic state files"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["emulator", "sqlite"],
+        default="emulator",
+        help="Upload into the Firestore emulator, or the SQLite stand-in "
+        "(default: emulator)",
+    )
+    parser.add_argument(
+        "--emulator-host",
+        type=str,
+        default=os.environ.get("FIRESTORE_EMULATOR_HOST", "localhost:8080"),
+        help="host:port of the Firestore emulator",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Seconds per commit for the sqlite backend (default: 0.05)",
+    )
+    parser.add_argument(
+        "--fault-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of sqlite commits that fail with ResourceExhausted "
+        "(default: 0)",
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=20_000,
+        help="Rows per synthetic state file (default: 20000)",
+    )
+    parser.add_argument(
+        "--states",
+        type=int,
+        default=2,
+        help="Number of synthetic state files (default: 2)",
+    )
+    parser.add_argument(
+        "--padding",
+        type=int,
+        default=0,
+        help="Extra characters of free text per document, to vary the "
+        "payload size (default: 0)",
+    )
+    parser.add_argument(
+        "--batch-sizes",
+        type=int,
+        nargs="+",
+        default=[100, 500, 1000],
+        help="Batch sizes to try (default: 100 500 1000)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=[1, 4, 8],
+        help="Concurrency levels to try (default: 1 4 8)",
+    )
+    parser.add_argument(
+        "--rate",
+        type=int,
+        default=1_000_000,
+        help="Write rate the controller is pinned to, high enough by "
+        "default that it doesn't hold the uploads back",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="Also write the results table to this csv file",
+    )
+    args = parser.parse_args()
+
+    if args.backend == "emulator":
+        backend = FirestoreEmulatorBackend(args.emulator_host)
+    else:
+        backend = SQLiteBackend(
+            latency=args.latency, fault_rate=args.fault_rate
+        )
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        files = []
+        for i in range(args.states):
+            state_name = f"bench-state-{i}"
+            path = os.path.join(work_dir, f"{state_name}-processed.csv.gz")
+            make_state_file(path, state_name, args.rows, args.padding, seed=i)
+            files.append((state_name, path))
+        print(
+            f"Generated {args.states} state files of {args.rows} rows "
+            f"({os.path.getsize(files[0][1]) / 1e6:.1f} MB each, gzipped)"
+        )
+
+        results = []
+        for batch_size in args.batch_sizes:
+            for concurrency in args.concurrency:
+                print(
+                    f"Uploading with batch size {batch_size}, "
+                    f"concurrency {concurrency}..."
+                )
+                results.append(
+                    run_case(
+                        backend,
+                        files,
+                        batch_size,
+                        concurrency,
+                        args.rate,
+                        work_dir,
+                    )
+                )
+
+    table = pd.DataFrame(results)
+    print()
+    print(table.to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
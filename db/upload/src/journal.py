@@ -0,0 +1,54 @@
+import json
+import os
+
+
+class UploadJournal:
+    """Append-only record of the batches committed while uploading one state
+    file. The first line holds the file's hash and the batch size, and every
+    committed batch adds a line with its first row offset, so an interrupted
+    upload can pick up where it stopped. The journal is removed once the
+    upload finishes.
+    """
+
+    def __init__(self, journal_dir, state_name):
+        self.path = os.path.join(journal_dir, f"{state_name}.jsonl")
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Returns the header and the set of committed row offsets"""
+        header = None
+        committed = set()
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a line cut short by a crash; its batch will be redone
+                    continue
+                if header is None:
+                    header = entry
+                else:
+                    committed.add(entry["offset"])
+        return header, committed
+
+    def start(self, file_path, file_hash, batch_size):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            header = {
+                "file": file_path,
+                "sha256": file_hash,
+                "batch_size": batch_size,
+            }
+            f.write(json.dumps(header) + "\n")
+
+    def record(self, offset, rows):
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"offset": offset, "rows": rows}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self):
+        if self.exists():
+            os.remove(self.path)
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# Columns that together identify a row from one release to the next. Rows
+# that share all of them are told apart by their order in the file
+KEY_COLUMNS = ["document_id", "agency_name", "start_date"]
+
+SNAPSHOT_SCHEMA = pa.schema(
+    [
+        ("key", pa.string()),
+        ("doc_index", pa.int64()),
+        ("content_hash", pa.string()),
+    ]
+)
+
+
+def content_hash(row):
+    """Hash of everything that ends up in a row's document"""
+    encoded = json.dumps(row, sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+class RowKeys:
+    """Builds the stable key of each row of a file, in file order"""
+
+    def __init__(self, key_columns=KEY_COLUMNS):
+        self.key_columns = key_columns
+        self.seen = {}
+
+    def __call__(self, row):
+        base = "\x1f".join(row.get(col) or "" for col in self.key_columns)
+        occurrence = self.seen.get(base, 0)
+        self.seen[base] = occurrence + 1
+        return f"{base}\x1f{occurrence}"
+
+
+class UploadSnapshot:
+    """What was last uploaded for one state: for every row its stable key,
+    the index in the id of the document it was written to, and a hash of its
+    content. Written once an upload finishes, and compared against by the
+    next differential upload.
+    """
+
+    def __init__(self, snapshot_dir, state_name):
+        self.path = os.path.join(snapshot_dir, f"{state_name}.parquet")
+        self.entries = {}
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Returns {key: (doc_index, content_hash)}"""
+        table = pq.read_table(self.path)
+        return dict(
+            zip(
+                table.column("key").to_pylist(),
+                zip(
+                    table.column("doc_index").to_pylist(),
+                    table.column("content_hash").to_pylist(),
+                    strict=False,
+                ),
+                strict=False,
+            )
+        )
+
+    def add(self, key, doc_index, row_hash):
+        self.entries[key] = (doc_index, row_hash)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        keys = list(self.entries)
+        table = pa.Table.from_arrays(
+            [
+                pa.array(keys, type=pa.string()),
+                pa.array([self.entries[k][0] for k in keys], type=pa.int64()),
+                pa.array([self.entries[k][1] for k in keys], type=pa.string()),
+            ],
+            schema=SNAPSHOT_SCHEMA,
+        )
+        tmp_path = self.path + ".tmp"
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, self.path)
+
+
+class ChangeSet:
+    """Creates, updates and deletes needed to go from a snapshot to a new
+    version of a state file. Document ids freed by deleted rows are handed to
+    new rows first, which turns a delete plus a create into a single write.
+    """
+
+    def __init__(self, previous):
+        self.previous = previous
+        self.current = {}
+        self.writes = []  # (doc_index, row, "create" | "update")
+        self.pending_creates = []  # (key, row_hash, row) awaiting an index
+        self.unchanged = 0
+
+    def add(self, key, row, row_hash):
+        old = self.previous.get(key)
+        if old is None:
+            self.pending_creates.append((key, row_hash, row))
+            return
+        doc_index, old_hash = old
+        self.current[key] = (doc_index, row_hash)
+        if old_hash == row_hash:
+            self.unchanged += 1
+        else:
+            self.writes.append((doc_index, row, "update"))
+
+    def finish(self):
+        """Assign document indexes to new rows and work out the deletes"""
+        used = {doc_index for doc_index, _ in self.current.values()}
+        freed = sorted(
+            doc_index
+            for doc_index, _ in self.previous.values()
+            if doc_index not in used
+        )
+        next_index = (
+            max(doc_index for doc_index, _ in self.previous.values()) + 1
+            if self.previous
+            else 0
+        )
+        freed.reverse()
+        for key, row_hash, row in self.pending_creates:
+            if freed:
+                doc_index = freed.pop()
+            else:
+                doc_index = next_index
+                next_index += 1
+            self.current[key] = (doc_index, row_hash)
+            self.writes.append((doc_index, row, "create"))
+        self.pending_creates = []
+        self.deletes = sorted(freed)
+        self.writes.sort(key=lambda write: write[0])
+
+    def counts(self):
+        creates = sum(1 for *_, kind in self.writes if kind == "create")
+        return {
+            "creates": creates,
+            "updates": len(self.writes) - creates,
+            "deletes": len(self.deletes),
+            "unchanged": self.unchanged,
+        }
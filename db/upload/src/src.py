@@ -2,10 +2,12 @@ import argparse
 import csv
 import gzip
 import os
+import sys
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+import pyarrow.parquet as pq
 from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted
 from tenacity import (
     retry,
@@ -15,21 +17,45 @@ from tenacity import (
 )
 
 
-# Initialize Firebase Admin SDK
-cred = credentials.Certificate("serviceAccountKey.json")
-firebase_admin.initialize_app(cred)
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "common"))
+from dataset_manifest import COMPLETE, DIFFING, UPLOADING, DatasetManifest
+from file_hash import sha256_file
+from journal import UploadJournal
+from rate_control import RateController, note_retry
+from snapshot import ChangeSet, RowKeys, UploadSnapshot, content_hash
+from storage import (
+    FirestoreBackend,
+    add_backend_arguments,
+    backend_from_args,
+)
+
+
+# Where the documents are written; main swaps in the backend picked on the
+# command line. The Firestore client is only created on first use
+storage = FirestoreBackend()
 
-# Get a Firestore client
-db = firestore.client()
+# Collection the state documents are uploaded to
+COLLECTION = "db_launch"
+
+# Where the upload journals of interrupted uploads are kept
+JOURNAL_DIR = "data/journal"
+
+# Where the snapshots of the last upload of each state are kept
+SNAPSHOT_DIR = "data/snapshots"
 
 
 @retry(
     stop=stop_after_attempt(10),
     wait=wait_exponential(multiplier=1, min=4, max=60),
     retry=retry_if_exception_type((ResourceExhausted, DeadlineExceeded)),
+    before_sleep=note_retry,
 )
-def commit_batch(batch):
+def commit_batch(batch, ops, controller):
+    """Commit a batch of `ops` writes, paced by the rate controller"""
+    controller.acquire(ops)
+    start = time.monotonic()
     batch.commit()
+    controller.record_success(time.monotonic() - start)
 
 
 def read_csv_gz_in_batches(file_path, batch_size=1000):
@@ -45,17 +71,55 @@ def read_csv_gz_in_batches(file_path, batch_size=1000):
             yield batch
 
 
+def read_parquet_in_batches(file_path, batch_size=1000):
+    """Stream a processed parquet file one record batch at a time. Values are
+    turned into strings (missing values into "") so the documents match what
+    csv.DictReader gives for the csv.gz format
+    """
+    parquet_file = pq.ParquetFile(file_path)
+    batch = []
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+        for row in record_batch.to_pylist():
+            batch.append(
+                {k: "" if v is None else str(v) for k, v in row.items()}
+            )
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def read_in_batches(file_path, batch_size=1000):
+    if file_path.endswith(".parquet"):
+        return read_parquet_in_batches(file_path, batch_size)
+    return read_csv_gz_in_batches(file_path, batch_size)
+
+
+def count_rows(file_path):
+    return sum(len(batch) for batch in read_in_batches(file_path))
+
+
+def describe_dry_run(counts):
+    """What a dry run of a differential upload would have done, from its
+    change set's counts"""
+    if counts is None:
+        return "would upload nothing - unchanged since the last upload"
+    writes = counts.get("creates", 0) + counts.get("updates", 0)
+    return f"would upload {writes} docs and delete {counts.get('deletes', 0)}"
+
+
 def check_state_exists(state_name):
     """Check if state data already exists in Firestore by looking for its first
-    document"""
+    document. Only used to fill in the manifest for states uploaded before
+    there was one"""
     doc_id = f"{state_name}-processed.csv_0"
-    doc_ref = db.collection("db_launch").document(doc_id)
-    doc = doc_ref.get()
-    return doc.exists
+    return storage.get(COLLECTION, doc_id) is not None
 
 
-def delete_state_data(state_name):
+def delete_state_data(state_name, controller=None):
     """Delete all documents for a given state based on document ID pattern"""
+    controller = controller or RateController()
     print(f"Deleting existing data for {state_name}...")
     batch_size = 1000
     docs_deleted = 0
@@ -63,71 +127,288 @@ def delete_state_data(state_name):
 
     while True:
         # Get a batch of documents with matching prefix
-        query = (
-            db.collection("db_launch")
-            .order_by("__name__")
-            .start_at([prefix])
-            .end_at([prefix + "\uf8ff"])
-            .limit(batch_size)
+        doc_ids = storage.list_ids(
+            COLLECTION,
+            start_at=prefix,
+            end_before=prefix + "\uf8ff",
+            limit=batch_size,
         )
-        docs = list(query.stream())
 
-        if not docs:
+        if not doc_ids:
             break
 
         # Delete documents in batches
-        batch = db.batch()
-        for doc in docs:
-            batch.delete(doc.reference)
+        batch = storage.batch()
+        for doc_id in doc_ids:
+            batch.delete(COLLECTION, doc_id)
             docs_deleted += 1
 
-        batch.commit()
-        time.sleep(1)
-        print(f"Deleted {docs_deleted} documents...")
+        commit_batch(batch, len(doc_ids), controller=controller)
+        print(f"Deleted {docs_deleted} documents... {controller.status()}")
 
     print(f"Finished deleting {docs_deleted} documents for {state_name}")
 
 
+def load_manifest(state_names=()):
+    """Read the upload manifest once. The first time round there is none, so
+    it's filled in by probing each state the old way"""
+    manifest = DatasetManifest(storage, COLLECTION)
+    if not manifest.load():
+        print("No upload manifest yet - checking which states are loaded")
+        for state_name in state_names:
+            if check_state_exists(state_name):
+                manifest.mark_legacy(state_name)
+    return manifest
+
+
+def document_id(state_name, doc_index):
+    # Removed state field as we're using document ID patterns instead
+    return f"{state_name}-processed.csv_{doc_index}"
+
+
+def build_batch(state_name, rows, first_row):
+    batch = storage.batch()
+    for i, row in enumerate(rows):
+        batch.set(COLLECTION, document_id(state_name, first_row + i), row)
+    return batch
+
+
+def commit_batches(batches, concurrency, controller, on_commit=None):
+    """Commit (batch, ops, tag) triples, keeping up to `concurrency` of them
+    in flight at once. `on_commit(tag, ops)` is called as each one lands.
+    Returns the number of writes committed"""
+    committed_ops = 0
+    start_time = time.time()
+    in_flight = {}
+
+    def wait_for_commits():
+        nonlocal committed_ops
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            # re-raises anything commit_batch gave up on
+            future.result()
+            ops, tag = in_flight.pop(future)
+            if on_commit:
+                on_commit(tag, ops)
+            committed_ops += ops
+        rows_per_second = committed_ops / (time.time() - start_time)
+        print(
+            f"Committed {committed_ops} documents. Speed: {rows_per_second:.2f} rows/second. {controller.status()}"
+        )
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        try:
+            for batch, ops, tag in batches:
+                future = pool.submit(
+                    commit_batch, batch, ops, controller=controller
+                )
+                in_flight[future] = (ops, tag)
+                # only read ahead as far as there are free workers
+                if len(in_flight) >= concurrency:
+                    wait_for_commits()
+            while in_flight:
+                wait_for_commits()
+        except BaseException:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+    return committed_ops
+
+
+def print_upload_stats(committed_rows, elapsed_time, controller):
+    rows_per_second = committed_rows / elapsed_time if elapsed_time else 0.0
+    print(f"Total time: {elapsed_time:.2f} seconds")
+    print(f"Average speed: {rows_per_second:.2f} rows/second")
+    print(controller.status())
+
+
 def upload_csv_gz_to_firestore(
-    file_path, state_name, force=False, batch_size=1000
+    file_path,
+    state_name,
+    force=False,
+    batch_size=1000,
+    concurrency=4,
+    controller=None,
+    journal_dir=JOURNAL_DIR,
+    snapshot_dir=SNAPSHOT_DIR,
+    manifest=None,
 ):
+    """Upload a processed state file, keeping up to `concurrency` batches
+    in flight at once, paced by the rate controller. Committed batches are
+    journaled, so an interrupted upload resumes where it stopped, and a
+    snapshot of what was uploaded is kept for later differential uploads.
+    The state's manifest entry is "uploading" until the last batch lands.
+    Returns (documents uploaded, seconds taken), or None if the state was
+    skipped"""
+    controller = controller or RateController()
+    manifest = manifest or load_manifest()
+    status = manifest.status(state_name)
+    journal = UploadJournal(journal_dir, state_name)
+    file_hash = sha256_file(file_path)
+    committed_offsets = set()
     if force:
         print(f"Force upload requested for {state_name}")
-        if check_state_exists(state_name):
+        journal.remove()
+        if status is not None:
             print(f"Deleting existing data for {state_name}")
-            delete_state_data(state_name)
+            delete_state_data(state_name, controller)
         else:
             print(f"No existing data found for {state_name}")
-    elif check_state_exists(state_name):
+    elif journal.exists():
+        header, committed_offsets = journal.load()
+        if header is None or header["sha256"] != file_hash:
+            raise ValueError(
+                f"{file_path} has changed since the interrupted upload of "
+                f"{state_name}; force the state to start over"
+            )
+        batch_size = header["batch_size"]
+        print(
+            f"Resuming {state_name} - {len(committed_offsets)} batches "
+            "already committed"
+        )
+    elif status == UPLOADING:
+        raise ValueError(
+            f"{state_name} was only partly uploaded and there's no journal "
+            "to resume it from; force the state to start over"
+        )
+    elif status == DIFFING:
+        raise ValueError(
+            f"{state_name} has an interrupted differential upload; rerun "
+            "with --diff to finish it, or force the state to start over"
+        )
+    elif status == COMPLETE:
         print(f"Skipping {state_name} - data already exists in Firestore")
         return
 
-    total_rows = 0
-    start_time = time.time()
+    if not committed_offsets:
+        journal.start(file_path, file_hash, batch_size)
+        manifest.mark_uploading(state_name, file_path, file_hash)
 
-    for csv_batch in read_csv_gz_in_batches(file_path, batch_size):
-        firestore_batch = db.batch()
+    snapshot = UploadSnapshot(snapshot_dir, state_name)
+    row_keys = RowKeys()
+    resumed_rows = 0
 
-        for row in csv_batch:
-            # Removed state field as we're using document ID patterns instead
-            doc_ref = db.collection("db_launch").document(
-                f"{state_name}-processed.csv_{total_rows}"
-            )
-            firestore_batch.set(doc_ref, row)
-            total_rows += 1
+    total_rows = 0
 
-        commit_batch(firestore_batch)
-        time.sleep(1)
+    def batches():
+        nonlocal resumed_rows, total_rows
+        first_row = 0
+        for csv_batch in read_in_batches(file_path, batch_size):
+            for i, row in enumerate(csv_batch):
+                snapshot.add(row_keys(row), first_row + i, content_hash(row))
+            if first_row in committed_offsets:
+                resumed_rows += len(csv_batch)
+            else:
+                batch = build_batch(state_name, csv_batch, first_row)
+                yield batch, len(csv_batch), first_row
+            first_row += len(csv_batch)
+        total_rows = first_row
 
-        elapsed_time = time.time() - start_time
-        rows_per_second = total_rows / elapsed_time
-        print(
-            f"Committed {total_rows} documents. Speed: {rows_per_second:.2f} rows/second"
+    start_time = time.time()
+    committed_rows = commit_batches(
+        batches(), concurrency, controller, on_commit=journal.record
+    )
+    snapshot.save()
+    manifest.mark_complete(state_name, file_path, file_hash, total_rows)
+    journal.remove()
+    elapsed_time = time.time() - start_time
+    print(f"Finished uploading {committed_rows} documents from {file_path}.")
+    if resumed_rows:
+        print(f"Skipped {resumed_rows} documents committed before resuming")
+    print_upload_stats(committed_rows, elapsed_time, controller)
+    return committed_rows, elapsed_time
+
+
+def diff_upload_to_firestore(
+    file_path,
+    state_name,
+    batch_size=1000,
+    concurrency=4,
+    controller=None,
+    journal_dir=JOURNAL_DIR,
+    snapshot_dir=SNAPSHOT_DIR,
+    manifest=None,
+    dry_run=False,
+):
+    """Bring a state's documents in line with a new processed file by
+    writing only the rows that were added or changed since the last upload
+    and deleting the ones that went away, going by the local snapshot of
+    that upload. The change set only depends on the snapshot and the file,
+    so an interrupted run, left "diffing" in the manifest, can simply be
+    repeated. Returns (writes committed, seconds taken), or with `dry_run`
+    the change set's counts without committing anything"""
+    controller = controller or RateController()
+    manifest = manifest or load_manifest()
+    status = manifest.status(state_name)
+    if status not in (COMPLETE, DIFFING):
+        print(f"No complete upload of {state_name} - uploading everything")
+        if dry_run:
+            return {"creates": count_rows(file_path)}
+        return upload_csv_gz_to_firestore(
+            file_path,
+            state_name,
+            batch_size=batch_size,
+            concurrency=concurrency,
+            controller=controller,
+            journal_dir=journal_dir,
+            snapshot_dir=snapshot_dir,
+            manifest=manifest,
         )
+    snapshot = UploadSnapshot(snapshot_dir, state_name)
+    if not snapshot.exists():
+        raise ValueError(
+            f"No upload snapshot for {state_name}, so its documents "
+            "can't be diffed; force the state once to take one"
+        )
+    file_hash = sha256_file(file_path)
+    if status == DIFFING:
+        # the snapshot is only replaced once every change has landed, so
+        # diffing against it again redoes the same idempotent writes
+        print(f"Resuming the interrupted differential upload of {state_name}")
+    elif manifest.get(state_name)["sha256"] == file_hash:
+        print(f"Skipping {state_name} - unchanged since the last upload")
+        return
 
-    print(f"Finished uploading {total_rows} documents from {file_path}.")
-    print(f"Total time: {elapsed_time:.2f} seconds")
-    print(f"Average speed: {rows_per_second:.2f} rows/second")
+    start_time = time.time()
+    changes = ChangeSet(snapshot.load())
+    row_keys = RowKeys()
+    for csv_batch in read_in_batches(file_path, batch_size):
+        for row in csv_batch:
+            changes.add(row_keys(row), row, content_hash(row))
+    changes.finish()
+    counts = changes.counts()
+    print(
+        f"Change set for {state_name}: {counts['creates']} creates, "
+        f"{counts['updates']} updates, {counts['deletes']} deletes, "
+        f"{counts['unchanged']} unchanged"
+    )
+    if dry_run:
+        return counts
+    manifest.mark_diffing(state_name, file_path, file_hash)
+
+    def batches():
+        for i in range(0, len(changes.writes), batch_size):
+            batch = storage.batch()
+            writes = changes.writes[i : i + batch_size]
+            for doc_index, row, _ in writes:
+                batch.set(COLLECTION, document_id(state_name, doc_index), row)
+            yield batch, len(writes), None
+        for i in range(0, len(changes.deletes), batch_size):
+            batch = storage.batch()
+            deletes = changes.deletes[i : i + batch_size]
+            for doc_index in deletes:
+                batch.delete(COLLECTION, document_id(state_name, doc_index))
+            yield batch, len(deletes), None
+
+    committed_ops = commit_batches(batches(), concurrency, controller)
+    snapshot.entries = changes.current
+    snapshot.save()
+    manifest.mark_complete(
+        state_name, file_path, file_hash, len(changes.current)
+    )
+    elapsed_time = time.time() - start_time
+    print(f"Finished applying {committed_ops} changes from {file_path}.")
+    print_upload_stats(committed_ops, elapsed_time, controller)
+    return committed_ops, elapsed_time
 
 
 def main():
@@ -140,12 +421,69 @@ def main():
         required=True,
         help="Input directory containing processed .csv.gz files",
     )
+    parser.add_argument(
+        "--input-format",
+        choices=["csv", "parquet"],
+        default="csv",
+        help="Format of the processed files: .csv.gz or .parquet "
+        "(default: csv)",
+    )
     parser.add_argument(
         "--delay",
         type=int,
-        default=5,
-        help="Delay in seconds between file uploads (default: 5)",
+        default=0,
+        help="Delay in seconds between file uploads (default: 0)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of batches to commit in parallel (default: 4)",
+    )
+    parser.add_argument(
+        "--initial-rate",
+        type=int,
+        default=500,
+        help="Starting write rate in documents/second; it ramps up by 50%% "
+        "every 5 minutes while writes succeed. The default follows "
+        "Firestore's 500/50/5 guidance for a cold collection, at the cost "
+        "of throughput: most states finish before the first ramp step. "
+        "Raise it for a collection that is already warm (default: 500)",
+    )
+    parser.add_argument(
+        "--max-rate",
+        type=int,
+        default=10_000,
+        help="Upper bound on the write rate in documents/second "
+        "(default: 10000)",
     )
+    parser.add_argument(
+        "--journal-dir",
+        type=str,
+        default=JOURNAL_DIR,
+        help="Directory for the journals used to resume interrupted "
+        f"uploads (default: {JOURNAL_DIR})",
+    )
+    parser.add_argument(
+        "--snapshot-dir",
+        type=str,
+        default=SNAPSHOT_DIR,
+        help="Directory for the snapshots of what was last uploaded "
+        f"(default: {SNAPSHOT_DIR})",
+    )
+    parser.add_argument(
+        "--diff",
+        action="store_true",
+        help="Only write the documents that changed since the last upload "
+        "of each state, and delete the ones that went away",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print what each state's upload would write and delete, "
+        "without writing anything",
+    )
+    add_backend_arguments(parser)
     parser.add_argument(
         "--force-states",
         type=str,
@@ -159,6 +497,9 @@ def main():
     )
     args = parser.parse_args()
 
+    global storage
+    storage = backend_from_args(args)
+
     if not os.path.exists(args.input_dir):
         raise ValueError(f"Input directory does not exist: {args.input_dir}")
 
@@ -177,25 +518,36 @@ def main():
         force_states = {state.lower() for state in state_dirs}
         print(f"Force uploading all {len(force_states)} available states")
 
-    # Get all .csv.gz files from state directories
+    # Get all processed files from state directories
+    extension = ".parquet" if args.input_format == "parquet" else ".csv.gz"
     csv_gz_files = []
     for state in state_dirs:
         state_file = os.path.join(
-            args.input_dir, state, f"{state}-processed.csv.gz"
+            args.input_dir, state, f"{state}-processed{extension}"
         )
         if os.path.exists(state_file):
             csv_gz_files.append(state_file)
 
     if not csv_gz_files:
-        print(f"No .csv.gz files found in {args.input_dir}")
+        print(f"No {extension} files found in {args.input_dir}")
         return
 
     print(f"Found {len(csv_gz_files)} files to upload")
+    manifest = load_manifest(
+        [os.path.basename(os.path.dirname(f)) for f in csv_gz_files]
+    )
 
     skipped_states = []
     successful_states = []
     failed_states = []
     forced_states = []
+    dry_run_states = {}
+    upload_speeds = {}
+    # one controller for the whole run, so the ramp carries over from state
+    # to state
+    controller = RateController(
+        initial_rate=args.initial_rate, max_rate=args.max_rate
+    )
 
     for file_path in csv_gz_files:
         state_name = os.path.basename(os.path.dirname(file_path))
@@ -204,18 +556,73 @@ def main():
         try:
             force_state = state_name.lower() in force_states
 
-            if not force_state and check_state_exists(state_name):
+            resuming = UploadJournal(args.journal_dir, state_name).exists()
+            status = manifest.status(state_name)
+            loaded = status == COMPLETE
+            diffing = (
+                args.diff
+                and status in (COMPLETE, DIFFING)
+                and not force_state
+                and not resuming
+            )
+            if not force_state and not resuming and not diffing and loaded:
                 print(
                     f"Skipping {state_name} - data already exists in Firebase"
                 )
                 skipped_states.append(state_name)
                 continue
 
+            if args.dry_run:
+                if diffing:
+                    outcome = describe_dry_run(
+                        diff_upload_to_firestore(
+                            file_path,
+                            state_name,
+                            snapshot_dir=args.snapshot_dir,
+                            manifest=manifest,
+                            dry_run=True,
+                        )
+                    )
+                elif resuming:
+                    outcome = "would resume its interrupted upload"
+                elif force_state and status is not None:
+                    outcome = (
+                        "would delete all its documents and upload "
+                        f"{count_rows(file_path)} docs"
+                    )
+                else:
+                    outcome = f"would upload {count_rows(file_path)} docs"
+                print(f"Dry run for {state_name}: {outcome}")
+                dry_run_states[state_name] = outcome
+                continue
+
             if force_state:
                 print(f"Force uploading {state_name}")
                 forced_states.append(state_name)
 
-            upload_csv_gz_to_firestore(file_path, state_name, force=force_state)
+            if diffing:
+                uploaded = diff_upload_to_firestore(
+                    file_path,
+                    state_name,
+                    concurrency=args.concurrency,
+                    controller=controller,
+                    journal_dir=args.journal_dir,
+                    snapshot_dir=args.snapshot_dir,
+                    manifest=manifest,
+                )
+            else:
+                uploaded = upload_csv_gz_to_firestore(
+                    file_path,
+                    state_name,
+                    force=force_state,
+                    concurrency=args.concurrency,
+                    controller=controller,
+                    journal_dir=args.journal_dir,
+                    snapshot_dir=args.snapshot_dir,
+                    manifest=manifest,
+                )
+            if uploaded:
+                upload_speeds[state_name] = uploaded
             print(f"Successfully uploaded {state_name}")
             successful_states.append(state_name)
 
@@ -223,7 +630,7 @@ def main():
             print(f"Error uploading {state_name}: {str(e)}")
             failed_states.append(state_name)
 
-        if file_path != csv_gz_files[-1]:
+        if args.delay and file_path != csv_gz_files[-1]:
             print(f"Waiting {args.delay} seconds before next upload...")
             time.sleep(args.delay)
 
@@ -233,6 +640,23 @@ def main():
     print(f"Force uploaded: {len(forced_states)} states")
     print(f"Skipped (existing data): {len(skipped_states)} states")
     print(f"Failed uploads: {len(failed_states)} states")
+    if args.dry_run:
+        print(f"Dry run (nothing written): {len(dry_run_states)} states")
+
+    if upload_speeds:
+        print("\nUpload speed by state:")
+        for state in sorted(upload_speeds):
+            docs, seconds = upload_speeds[state]
+            docs_per_second = docs / seconds if seconds else 0.0
+            print(
+                f"  - {state}: {docs} documents in {seconds:.2f} seconds "
+                f"({docs_per_second:.2f} docs/second)"
+            )
+
+    if dry_run_states:
+        print("\nDry run states:")
+        for state in sorted(dry_run_states):
+            print(f"  - {state}: {dry_run_states[state]}")
 
     if forced_states:
         print("\nForce uploaded states:")
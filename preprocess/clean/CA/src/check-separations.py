@@ -0,0 +1,184 @@
+import argparse
+import importlib.util
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# clean-corrections.py can't be imported by name
+spec = importlib.util.spec_from_file_location(
+    "clean_corrections", Path(__file__).with_name("clean-corrections.py")
+)
+corrections = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(corrections)
+
+
+def getargs():
+    parser = argparse.ArgumentParser(
+        description="Check the separation linking in clean-corrections.py "
+        "against the original merge-and-loop implementation and compare "
+        "timings"
+    )
+    parser.add_argument(
+        "--input",
+        help="Raw corrections csv from xl2csv.py, e.g. "
+        "output/ca-23-corrections-raw.csv; generated data if not given",
+    )
+    parser.add_argument(
+        "--people",
+        type=int,
+        default=20_000,
+        help="Number of generated people when no input is given",
+    )
+    parser.add_argument(
+        "--max-events",
+        type=int,
+        default=8,
+        help="Most events per generated person; long careers on one "
+        "position are where pairing every appt with every separation hurts",
+    )
+    return parser.parse_args()
+
+
+# the original implementation, kept as the reference {{{
+def legacy_pick_seps(cands):
+    """link separations to the right job record"""
+    if len(cands) == 1:
+        return cands
+    out = cands.loc[cands.dd == cands.dd.min()]
+    assert len(out) <= 1
+    return out
+
+
+def legacy_make_stints(df, work, seps, matchcols):
+    merged = work.merge(seps, on=matchcols, how="inner")
+    merged["dd"] = merged.separation_date - merged.event_date
+    merged = merged.loc[merged.dd >= pd.Timedelta(0, "days")].copy()
+    f1 = pd.concat(
+        legacy_pick_seps(g) for gid, g in merged.groupby("record_nbr")
+    )
+    f2 = pd.concat(legacy_pick_seps(g) for gid, g in f1.groupby("sep_rec_nbr"))
+    stints = f2.drop("dd", axis=1, inplace=False).reset_index(drop=True)
+    assert len(stints[["record_nbr"]].drop_duplicates()) == len(stints)
+    assert len(stints[["sep_rec_nbr"]].drop_duplicates()) == len(stints)
+    return stints
+
+
+# }}}
+
+
+def make_sample(npeople, max_events=8, seed=0):
+    """Raw CDCR-style transactions: people appointed to and separated from
+    positions, often the same one several times, with separations missing
+    their appointment and appointments not yet separated"""
+    rng = np.random.default_rng(seed)
+    nevents = rng.integers(1, max_events + 1, npeople)
+    nrows = nevents.sum()
+    person = np.repeat(np.arange(npeople), nevents)
+    # every person's events are on distinct days, so no window ties
+    first = np.r_[0, np.cumsum(nevents)[:-1]]
+    gaps = rng.integers(1, 12000 // max_events, nrows)
+    gaps[first] = rng.integers(0, 3000, npeople)
+    days = np.cumsum(gaps)
+    days -= np.repeat(days[first] - gaps[first], nevents)
+    event_date = pd.to_datetime("2005-01-01") + pd.to_timedelta(days, "D")
+
+    agcy = rng.integers(0, 40, npeople)
+    agcy_codes = np.char.zfill((100 + np.arange(40)).astype(str), 3)
+    class_codes = np.char.zfill((1 + np.arange(12) * 7).astype(str), 3)
+    position = (
+        agcy_codes[np.repeat(agcy, nevents)]
+        + "-"
+        + np.char.zfill(rng.integers(0, 1000, nrows).astype(str), 3)
+        + "-"
+        + class_codes[rng.integers(0, 12, nrows)]
+        + np.char.zfill(rng.integers(0, 10, nrows).astype(str), 1)
+        + "-"
+        + np.char.zfill(rng.integers(0, 1000, nrows).astype(str), 3)
+    )
+    # most events are on the same position as the one before
+    stay = rng.random(nrows) < 0.7
+    stay[first] = False
+    for _ in range(nevents.max()):
+        position = np.where(stay, np.r_[position[:1], position[:-1]], position)
+
+    # appointments and separations mostly take turns
+    nth = np.arange(nrows) - np.repeat(first, nevents)
+    event = np.where(nth % 2 == 0, "APPOINTMENT", "SEPARATION").astype(object)
+    event[rng.random(nrows) < 0.1] = "SEPARATION"
+    other = rng.random(nrows) < 0.05
+    event[other] = "TRANSFER"
+    stat05 = np.where(other | (rng.random(nrows) < 0.2), "Y", None)
+
+    return pd.DataFrame(
+        {
+            "unique_id": person,
+            "last_name": rng.choice(["SMITH", "Garcia", "nguyen"], npeople)[
+                person
+            ],
+            "first_name": rng.choice(["JOHN A", "Maria", "WEI  L"], npeople)[
+                person
+            ],
+            "facility_name": np.char.add(
+                "FACILITY ", np.repeat(agcy, nevents).astype(str)
+            ),
+            "class_title": rng.choice(["OFFICER", "SERGEANT"], nrows),
+            "trans_eff_date": event_date.strftime("%Y-%m-%d"),
+            "type_of_transaction": event,
+            "position_number": position,
+            "pos_seq": rng.integers(1, 5, nrows),
+            "06_30_2005_cs_ind": stat05,
+        }
+    )
+
+
+def run(cpost, make_stints):
+    """clean-corrections.py from the raw data up to the flattened stints,
+    linking separations with `make_stints`. Returns the output, the stints
+    each make_stints call found and the seconds spent linking"""
+    spent = [0.0]
+    stints = []
+
+    def timed_make_stints(*args):
+        start = time.perf_counter()
+        out = make_stints(*args)
+        spent[0] += time.perf_counter() - start
+        stints.append(out)
+        return out
+
+    corrections.make_stints = timed_make_stints
+    clean = corrections.clean_events(cpost)
+    pass1 = corrections.link_separations(
+        clean, usecols=["person_nbr", "position"]
+    )
+    all_stint_data = corrections.link_by_matchable(pass1)
+    out = corrections.flatten_stints(all_stint_data)
+    return out, stints, spent[0]
+
+
+if __name__ == "__main__":
+    args = getargs()
+
+    if args.input:
+        cpost = pd.read_csv(args.input)
+    else:
+        cpost = make_sample(args.people, args.max_events)
+    cpost = cpost.drop_duplicates().rename(
+        columns={"06_30_2005_cs_ind": "stat05"}, inplace=False
+    )
+    print(f"Checking {len(cpost)} rows")
+
+    new_make_stints = corrections.make_stints
+    expected, expected_stints, legacy_secs = run(cpost, legacy_make_stints)
+    actual, actual_stints, new_secs = run(cpost, new_make_stints)
+    corrections.make_stints = new_make_stints
+
+    for new, legacy in zip(actual_stints, expected_stints, strict=True):
+        pd.testing.assert_frame_equal(new, legacy)
+    pd.testing.assert_frame_equal(actual, expected)
+    print(f"Output matches the original implementation ({len(actual)} rows)")
+    print(f"Merge and loop: {legacy_secs:.2f} seconds linking separations")
+    print(f"As-of join:     {new_secs:.2f} seconds linking separations")
+    print(f"Speedup:        {legacy_secs / new_secs:.1f}x")
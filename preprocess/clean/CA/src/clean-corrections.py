@@ -124,12 +124,17 @@ def standardize(df, code, desc):
 
 # go from event data to stint data {{{
 def make_stints(df, work, seps, matchcols):
-    merged = work.merge(seps, on=matchcols, how="inner")
-    merged["dd"] = merged.separation_date - merged.event_date
-    merged = merged.loc[merged.dd >= pd.Timedelta(0, "days")].copy()
-    f1 = pd.concat(pick_seps(g) for gid, g in merged.groupby("record_nbr"))
-    f2 = pd.concat(pick_seps(g) for gid, g in f1.groupby("sep_rec_nbr"))
-    stints = f2.drop("dd", axis=1, inplace=False).reset_index(drop=True)
+    links = nearest_separations(work, seps, matchcols)
+    links = pick_seps(links, "sep_rec_nbr")
+    stints = (
+        work.merge(
+            links[["record_nbr", "sep_rec_nbr", "separation_date"]],
+            on="record_nbr",
+            how="inner",
+        )
+        .sort_values("sep_rec_nbr", kind="stable")
+        .reset_index(drop=True)
+    )
     assert len(stints[["record_nbr"]].drop_duplicates()) == len(stints)
     assert len(stints[["sep_rec_nbr"]].drop_duplicates()) == len(stints)
     return stints
@@ -174,26 +179,51 @@ def prep_separations(df, matchcols):
     )
 
 
-def pick_seps(cands):
-    """link separations to the right job record"""
-    if len(cands) == 1:
-        return cands
-    out = cands.loc[cands.dd == cands.dd.min()]
-    assert len(out) <= 1
-    return out
+def nearest_separations(work, seps, matchcols):
+    """link each appt/change to the soonest separation on or after it with
+    the same matchcols, by an as-of join in date order rather than pairing
+    every appt with every separation and keeping the tightest. only the
+    keys go through the join"""
+    left = work.loc[
+        work.event_date.notna(), ["record_nbr", "event_date"] + matchcols
+    ].sort_values("event_date", kind="stable")
+    right = seps.loc[
+        seps.separation_date.notna(),
+        ["sep_rec_nbr", "separation_date"] + matchcols,
+    ].sort_values("separation_date", kind="stable")
+    # two separations on the same day can't be told apart
+    tied = right.duplicated(matchcols + ["separation_date"], keep=False)
+    links = pd.merge_asof(
+        left,
+        right.assign(tied=tied),
+        left_on="event_date",
+        right_on="separation_date",
+        by=matchcols,
+        direction="forward",
+    )
+    links = links.loc[links.sep_rec_nbr.notna()]
+    assert not links.tied.any()
+    links = links.astype({"sep_rec_nbr": right.sep_rec_nbr.dtype})
+    links["dd"] = links.separation_date - links.event_date
+    return links
 
 
-# }}}
+def pick_seps(cands, key):
+    """link separations to the right job record: for each value of `key`,
+    keep the candidate with the tightest window, for every group at once"""
+    tightest = cands.dd == cands.groupby(key).dd.transform("min")
+    out = cands.loc[tightest]
+    # a tie for the tightest window can't be resolved
+    assert not out[key].duplicated().any()
+    # in key order, as concatenating the groups one by one gave
+    return out.sort_values(key, kind="stable")
 
-if __name__ == "__main__":
-    args = getargs()
 
-    cpost = (
-        pd.read_csv(args.input)
-        .drop_duplicates()
-        .rename(columns={"06_30_2005_cs_ind": "stat05"}, inplace=False)
-    )
+# }}}
 
+
+# cleaning the events, linking them and flattening to stints {{{
+def clean_events(cpost):
     clean = (
         cpost.pipe(clean_names)
         .pipe(select_or_create_indexcols)
@@ -208,9 +238,10 @@ if __name__ == "__main__":
     assert all(
         (clean.event.isin(["APPOINTMENT", "SEPARATION"])) | (clean.stat05_ind)
     )
+    return clean
 
-    pass1 = link_separations(clean, usecols=["person_nbr", "position"])
 
+def link_by_matchable(pass1):
     # the first pass of linking is based on the position number
     # after that, if there is an unlinked separation that is the same agcy+rank as an unterminated appt, use that.
     init_db = (
@@ -251,7 +282,7 @@ if __name__ == "__main__":
         ["person_nbr", "matchable"],
     )
 
-    all_stint_data = pd.concat(
+    return pd.concat(
         [
             extra_stints.drop("sep_rec_nbr", axis=1, inplace=False),
             init_db.loc[
@@ -264,6 +295,8 @@ if __name__ == "__main__":
         ignore_index=True,
     ).sort_values(["person_nbr", "matchable", "event_date"])
 
+
+def flatten_stints(all_stint_data):
     # now flatten stints at the same location with the same rank
     all_stint_data["new_group"] = (
         all_stint_data.groupby(["person_nbr", "matchable"])
@@ -315,7 +348,7 @@ if __name__ == "__main__":
     assert all(flat.start_date.notna() | flat.event_date.isna())
     assert all(flat.end_date.notna() | flat.separation_date.isna())
 
-    out = (
+    return (
         flat[
             [
                 "person_nbr",
@@ -336,6 +369,23 @@ if __name__ == "__main__":
         )
     )
 
+
+# }}}
+
+if __name__ == "__main__":
+    args = getargs()
+
+    cpost = (
+        pd.read_csv(args.input)
+        .drop_duplicates()
+        .rename(columns={"06_30_2005_cs_ind": "stat05"}, inplace=False)
+    )
+
+    clean = clean_events(cpost)
+    pass1 = link_separations(clean, usecols=["person_nbr", "position"])
+    all_stint_data = link_by_matchable(pass1)
+    out = flatten_stints(all_stint_data)
+
     origlen = len(clean[["person_nbr", "agcy_name"]].drop_duplicates())
     outlen = len(out[["person_nbr", "agency_name"]].drop_duplicates())
     assert origlen == outlen
@@ -1,7 +1,13 @@
-import nameparser
+import sys
+from pathlib import Path
+
 import pandas as pd
 
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[4] / "common"))
+from human_names import split_human_names
+
+
 term_code_dictionary = {
     "1": "Resigned",
     "2": "Discharged",
@@ -20,10 +26,10 @@ term_code_dictionary = {
 
 def clean_names(df):
     out = df
-    hn = out.officer_name.apply(nameparser.HumanName)
-    out["last_name"] = hn.apply(lambda x: x.last)
-    out["first_name"] = hn.apply(lambda x: x.first)
-    out["middle_name"] = hn.apply(lambda x: x.middle)
+    parts = split_human_names(out.officer_name)
+    out["last_name"] = parts["last"]
+    out["first_name"] = parts["first"]
+    out["middle_name"] = parts["middle"]
     return out
 
 
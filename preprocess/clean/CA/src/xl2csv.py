@@ -1,5 +1,10 @@
 import argparse
+import csv
+import datetime
+import os
+import time
 
+import openpyxl
 import pandas as pd
 
 
@@ -11,45 +16,114 @@ def getargs():
     return parser.parse_args()
 
 
-def clean_colnames(df):
-    df.columns = (
-        df.columns.str.lower()
+def clean_colnames(columns):
+    return list(
+        pd.Index(columns)
+        .str.lower()
         .str.replace(" ", "_")
         .str.replace("/", "_")
         .str.replace("\n", "_")
         .str.replace("_{2,}", "_", regex=True)
     )
-    return df
 
 
 def clean_sheetname(sheetname):
     return sheetname.lower().replace(" ", "_")
 
 
-def write_sheets(sheetdata, outname):
-    if len(sheetdata.keys()) == 1:
-        key = list(sheetdata.keys())[0]
-        df = sheetdata[key]
-        df.to_csv(outname, index=False)
-        return True
-    for sfx, df in sheetdata.items():
-        outfile = outname.replace(".csv", f"-{sfx}.csv")
-        df.to_csv(outfile, index=False)
-    return True
+def name_columns(header):
+    """column names the way pd.read_excel gives them: blanks become
+    "Unnamed: <i>" and repeats get a ".<n>" suffix"""
+    names = []
+    seen = {}
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value == "" else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        seen.setdefault(name, 0)
+        names.append(name)
+    return names
+
+
+def convert_cell(value):
+    """a cell value as csv text, with pd.read_excel's conversions: empty
+    cells are blank and whole-number floats are ints"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime.datetime):
+        if value.time() == datetime.time(0):
+            return value.strftime("%Y-%m-%d")
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
 
+def sheet_rows(sheet):
+    """each row as text without its trailing blanks. blank rows at the end
+    of the sheet are dropped, as read_excel drops them"""
+    blanks = 0
+    for row in sheet.iter_rows(values_only=True):
+        cells = [convert_cell(value) for value in row]
+        while cells and cells[-1] == "":
+            cells.pop()
+        if not cells:
+            blanks += 1
+            continue
+        for _ in range(blanks):
+            yield []
+        blanks = 0
+        yield cells
 
-def read_sheets(filename, header):
-    sheets = pd.ExcelFile(filename).sheet_names
-    alldata = {
-        clean_sheetname(nm): pd.read_excel(
-            filename, sheet_name=nm, header=header
-        ).pipe(clean_colnames)
-        for nm in sheets
-    }
-    return alldata
+
+def stream_sheet(sheet, header, outfile):
+    """write one sheet to csv a row at a time, so memory stays flat however
+    big the sheet is. returns the number of data rows"""
+    rows = sheet_rows(sheet)
+    for _ in range(header):
+        next(rows, None)
+    columns = clean_colnames(name_columns(next(rows, [])))
+    nrows = 0
+    tmpfile = outfile + ".tmp"
+    with open(tmpfile, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for cells in rows:
+            if len(cells) > len(columns):
+                raise ValueError(
+                    f"{sheet.title}: data row {nrows + 1} has more cells "
+                    "than the header"
+                )
+            writer.writerow(cells + [""] * (len(columns) - len(cells)))
+            nrows += 1
+    os.replace(tmpfile, outfile)
+    return nrows
+
+
+def write_sheets(filename, header, outname):
+    # read-only mode streams rows from the file instead of loading it all,
+    # and the workbook is only opened (and parsed) once for every sheet
+    workbook = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            if len(workbook.worksheets) == 1:
+                outfile = outname
+            else:
+                sfx = clean_sheetname(sheet.title)
+                outfile = outname.replace(".csv", f"-{sfx}.csv")
+            start = time.time()
+            nrows = stream_sheet(sheet, header, outfile)
+            secs = time.time() - start
+            print(
+                f"{sheet.title}: {nrows} rows to {outfile} in {secs:.1f} "
+                f"seconds ({nrows / max(secs, 1e-9):.0f} rows/sec)"
+            )
+    finally:
+        workbook.close()
+    return True
 
 
 if __name__ == "__main__":
     args = getargs()
-    xldata = read_sheets(args.input, header=args.header)
-    write_sheets(xldata, args.output)
+    write_sheets(args.input, header=args.header, outname=args.output)
@@ -3,12 +3,22 @@
 # Copyright:   2024, HRDAG, GPL v2 or later
 # =========================================
 # us-post-data/preprocess/clean/KS/import/src
+import argparse
+import hashlib
+import json
 import logging
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import pandas as pd
-from nameparser import HumanName
+import pyarrow as pa
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[5] / "common"))
+from file_hash import sha256_file
+from human_names import split_human_names
 
 
 # Configue the logger
@@ -56,31 +66,112 @@ column_names = [
 ]
 
 
-def clean_names(df):
+# how each workbook is read; part of the cache key, so changing it
+# invalidates the cache
+READ_OPTIONS = {"skiprows": 5, "usecols": "c:k"}
+
+
+def getargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default="../input/")
+    parser.add_argument("--output", default="../output/ks-2024-index.csv")
+    parser.add_argument("--cache-dir", default="../output/parsed/")
+    parser.add_argument("--workers", default=os.cpu_count(), type=int)
+    return parser.parse_args()
+
+
+def cache_stem(cache_dir, file_path):
+    """where a workbook's parsed frame is cached, keyed by the workbook's
+    content and the read options, without an extension"""
+    options = hashlib.sha256(
+        json.dumps(READ_OPTIONS, sort_keys=True).encode()
+    ).hexdigest()[:8]
+    return os.path.join(cache_dir, f"{sha256_file(file_path)}-{options}")
+
+
+def is_cached(stem):
+    return os.path.exists(stem + ".parquet") or os.path.exists(stem + ".pkl")
+
+
+def read_cached(stem):
+    """the cached frame, or None if the workbook hasn't been parsed yet"""
+    if os.path.exists(stem + ".parquet"):
+        return pd.read_parquet(stem + ".parquet")
+    if os.path.exists(stem + ".pkl"):
+        return pd.read_pickle(stem + ".pkl")
+    return None
+
+
+def parse_workbook(file_path, stem):
+    """read one workbook (the slow part) and cache it as parquet. columns
+    mixing types that arrow can't store, like dates next to text, are
+    cached as a pickle instead"""
+    df = pd.read_excel(file_path, **READ_OPTIONS)
+    tmp_path = f"{stem}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, stem + ".parquet")
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, stem + ".pkl")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return len(df)
+
+
+def load_workbooks(files, cache_dir, workers):
+    """every workbook's frame, in order. workbooks not seen before are
+    parsed in a process pool; the rest come straight from the cache"""
+    os.makedirs(cache_dir, exist_ok=True)
+    stems = [cache_stem(cache_dir, x) for x in files]
+    missing = [
+        (x, stem)
+        for x, stem in zip(files, stems, strict=True)
+        if not is_cached(stem)
+    ]
+    logger.info(
+        f"{len(files) - len(missing)} of {len(files)} workbooks cached, "
+        f"parsing {len(missing)}"
+    )
+    if missing:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = pool.map(
+                parse_workbook,
+                [x for x, _ in missing],
+                [stem for _, stem in missing],
+            )
+            for (x, _), nrows in zip(missing, parsed, strict=True):
+                logger.info(f"Parsed {x} ({nrows} rows)")
+    return [read_cached(stem) for stem in stems]
+
+
+def clean_names(df, workers=1):
     out = df
-    hn = out.officer_name.apply(HumanName)
-    out["last_name"] = hn.apply(lambda x: x.last)
-    out["first_name"] = hn.apply(lambda x: x.first)
-    out["middle_name"] = hn.apply(lambda x: x.middle)
-    out["middle_initial"] = hn.apply(lambda x: x.middle[:1])
-    out["suffix"] = hn.apply(lambda x: x.suffix)
+    parts = split_human_names(out.officer_name, workers)
+    out["last_name"] = parts["last"]
+    out["first_name"] = parts["first"]
+    out["middle_name"] = parts["middle"]
+    out["middle_initial"] = parts["middle_initial"]
+    out["suffix"] = parts["suffix"]
     return out
 
 
 if __name__ == "__main__":
-    data_input = Path("../input/")
+    args = getargs()
+    data_input = Path(args.input)
 
     filtered_files = [
         x for x in data_input.rglob("*.xls") if "Certification" not in str(x)
     ]
     complete = pd.concat(
-        pd.read_excel(x, skiprows=5, usecols="c:k") for x in filtered_files
+        load_workbooks(filtered_files, args.cache_dir, args.workers)
     )
     logger.info("Data Loaded")
 
     complete.columns = complete.columns.str.lower()
     complete.columns = complete.columns.str.replace(" ", "_")
-    new_complete = clean_names(complete)
+    new_complete = clean_names(complete, args.workers)
     new_complete.drop(["unnamed:_3", "unnamed:_4"], axis=1, inplace=True)
     logger.info("Columns cleaned")
 
@@ -119,7 +210,7 @@ if __name__ == "__main__":
     print("\n")
 
     logger.info("Data being exported to output directory.")
-    output_path = "../output/ks-2024-index.csv"
+    output_path = args.output
     dir_path = os.path.dirname(output_path)
     os.makedirs(dir_path, exist_ok=True)
     new_complete_2.to_csv(output_path, index=False)
@@ -0,0 +1,183 @@
+import argparse
+import importlib.util
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# import-mn.py can't be imported by name
+spec = importlib.util.spec_from_file_location(
+    "import_mn", Path(__file__).with_name("import-mn.py")
+)
+import_mn = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(import_mn)
+
+
+def getargs():
+    parser = argparse.ArgumentParser(
+        description="Check propagate_uids in import-mn.py against the "
+        "original row-by-row implementation and compare timings"
+    )
+    parser.add_argument(
+        "--input",
+        help="MN workbook, e.g. input/mn-2025-01-21.xlsx; generated data "
+        "if not given",
+    )
+    parser.add_argument(
+        "--people",
+        type=int,
+        default=30_000,
+        help="Number of generated people when no input is given",
+    )
+    return parser.parse_args()
+
+
+# the original implementation, kept as the reference {{{
+def legacy_propagate_uids(df):
+    result_df = df.copy()
+
+    # Initialize variables to track current person
+    current_uid = None
+    current_person_rows = []
+
+    # Process rows sequentially
+    processed_rows = []
+
+    for _, row in result_df.iterrows():
+        # Check if this is a subtotal row (has 'Subtotal' in last_name)
+        if isinstance(row["last_name"], str) and "Subtotal" in row["last_name"]:
+            # Process accumulated rows for the previous person
+            if current_person_rows:
+                processed_rows.extend(current_person_rows)
+
+            # Reset tracking variables
+            current_uid = None
+            current_person_rows = []
+
+            # Add the subtotal row
+            processed_rows.append(row.to_dict())
+
+        else:
+            # If this row has a non-NaN UID, store it as the current UID
+            if pd.notna(row["person_nbr"]):
+                current_uid = row["person_nbr"]
+
+            # Create a copy of the row and update its UID
+            row_dict = row.to_dict()
+            if current_uid is not None:
+                row_dict["person_nbr"] = current_uid
+
+            # Add this row to the current person's rows
+            current_person_rows.append(row_dict)
+
+    # Process the last person's rows if any remain
+    if current_person_rows:
+        processed_rows.extend(current_person_rows)
+
+    # Convert processed rows back to DataFrame
+    result_df = pd.DataFrame(processed_rows)
+
+    # Ensure numeric UIDs where possible
+    result_df["person_nbr"] = pd.to_numeric(
+        result_df["person_nbr"], errors="ignore"
+    )
+
+    return result_df
+
+
+# }}}
+
+
+def make_sample(npeople, seed=0):
+    """The MN roster as read_excel gives it: a few title rows, then each
+    person's uid on their first agency row only, followed by a Subtotal
+    row. Some people have no uid at all"""
+    rng = np.random.default_rng(seed)
+    nagencies = rng.integers(1, 6, npeople)
+    rows = []
+    for i in range(9):
+        rows.append({"Unnamed: 1": f"Report header {i}" if i % 2 else None})
+    for person, n in enumerate(nagencies):
+        uid = None if rng.random() < 0.02 else 100_000 + person
+        for j in range(n):
+            rows.append(
+                {
+                    "Unnamed: 1": uid if j == 0 else None,
+                    "Unnamed: 3": f"LAST{person}",
+                    "Unnamed: 4": "FIRST",
+                    "Unnamed: 5": None if j % 2 else "M",
+                    "Unnamed: 6": rng.choice(["Duluth PD", "Anoka Co. SO"]),
+                    "Unnamed: 7": rng.choice(["Active", "Terminated"]),
+                    "Unnamed: 8": pd.Timestamp("2000-01-01")
+                    + pd.Timedelta(int(rng.integers(0, 8000)), "D"),
+                    "Unnamed: 9": "Active",
+                    "Unnamed: 10": None if j == n - 1 else "01/02/2020",
+                }
+            )
+        rows.append({"Unnamed: 1": "Subtotal", "Unnamed: 3": f"Subtotal {n}"})
+    df = pd.DataFrame(rows)
+    df.insert(0, "Unnamed: 0", None)
+    df.insert(2, "Unnamed: 2", None)
+    return df
+
+
+def missing_as_none(df):
+    """every missing value as None. iterrows turns rows with nothing in
+    them into all-NaT rows, and columns with nothing else in them into
+    datetimes; those rows are dropped later on, so only the values are
+    compared"""
+    return df.astype(object).where(df.notna(), None)
+
+
+def run_import(df, propagate_uids):
+    """the rest of import-mn.py after rename_cols, as the csv it writes"""
+    with warnings.catch_warnings():
+        # the importer's own SettingWithCopy warnings would bury the results
+        warnings.simplefilter("ignore")
+        out = (
+            df.pipe(propagate_uids)
+            .pipe(import_mn.remove_first_8_rows)
+            .pipe(import_mn.drop_empty_rows)
+            .pipe(import_mn.drop_cols)
+            .pipe(import_mn.clean_agency_name)
+            .pipe(import_mn.fix_dates)
+            .pipe(import_mn.clean_status)
+        )
+    return out.to_csv(index=False)
+
+
+def timed(func, df):
+    start = time.perf_counter()
+    out = func(df)
+    return out, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    args = getargs()
+
+    if args.input:
+        raw = pd.read_excel(args.input)
+    else:
+        raw = make_sample(args.people)
+    df = raw.pipe(import_mn.remove_first_column).pipe(import_mn.rename_cols)
+    print(f"Checking {len(df)} rows")
+
+    with warnings.catch_warnings():
+        # errors="ignore" in pd.to_numeric is deprecated
+        warnings.simplefilter("ignore", FutureWarning)
+        expected, legacy_secs = timed(legacy_propagate_uids, df)
+        actual, new_secs = timed(import_mn.propagate_uids, df)
+
+    pd.testing.assert_frame_equal(
+        missing_as_none(actual), missing_as_none(expected)
+    )
+    assert run_import(df, import_mn.propagate_uids) == run_import(
+        df, legacy_propagate_uids
+    )
+    print("Output matches the row-by-row implementation, row for row")
+    print(f"Row by row: {legacy_secs:.2f} seconds")
+    print(f"Vectorized: {new_secs:.2f} seconds")
+    print(f"Speedup:    {legacy_secs / new_secs:.1f}x")
@@ -3,9 +3,16 @@
 # note: code originally by @ayyubibrahimi for aug2024 release
 # adapted for 2025 update by @tarakc02
 
+import sys
+from pathlib import Path
+
 import pandas as pd
 
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[4] / "common"))
+from agency_names import canonicalize_agency_names
+
+
 # dealing with goofy excel format {{{
 def remove_first_column(df):
     df = df.iloc[:, 1:]
@@ -13,48 +20,22 @@ def remove_first_column(df):
 
 
 def propagate_uids(df):
-    result_df = df.copy()
-
-    # Initialize variables to track current person
-    current_uid = None
-    current_person_rows = []
-
-    # Process rows sequentially
-    processed_rows = []
-
-    for _, row in result_df.iterrows():
-        # Check if this is a subtotal row (has 'Subtotal' in last_name)
-        if isinstance(row["last_name"], str) and "Subtotal" in row["last_name"]:
-            # Process accumulated rows for the previous person
-            if current_person_rows:
-                processed_rows.extend(current_person_rows)
-
-            # Reset tracking variables
-            current_uid = None
-            current_person_rows = []
-
-            # Add the subtotal row
-            processed_rows.append(row.to_dict())
-
-        else:
-            # If this row has a non-NaN UID, store it as the current UID
-            if pd.notna(row["person_nbr"]):
-                current_uid = row["person_nbr"]
-
-            # Create a copy of the row and update its UID
-            row_dict = row.to_dict()
-            if current_uid is not None:
-                row_dict["person_nbr"] = current_uid
-
-            # Add this row to the current person's rows
-            current_person_rows.append(row_dict)
-
-    # Process the last person's rows if any remain
-    if current_person_rows:
-        processed_rows.extend(current_person_rows)
+    """fill each person's uid down over their agency rows. a row with
+    "Subtotal" in last_name ends the person: it keeps its own uid, and
+    nothing is filled past it"""
+    result_df = df.reset_index(drop=True)
+
+    # str() is only "Subtotal"-like for the strings that contain it
+    subtotal = (
+        result_df["last_name"].astype(str).str.contains("Subtotal", regex=False)
+    )
+    # each subtotal row starts a new block, and uids only fill within one
+    block = subtotal.cumsum()
+    filled = result_df["person_nbr"].where(~subtotal).groupby(block).ffill()
+    result_df["person_nbr"] = result_df["person_nbr"].where(subtotal, filled)
 
-    # Convert processed rows back to DataFrame
-    result_df = pd.DataFrame(processed_rows)
+    # the same dtypes as building the frame back up from rows would give
+    result_df = result_df.infer_objects()
 
     # Ensure numeric UIDs where possible
     result_df["person_nbr"] = pd.to_numeric(
@@ -100,11 +81,8 @@ def rename_cols(df):
 
 # cleaning data {{{
 def clean_agency_name(df):
-    df.loc[:, "agency_name"] = (
-        df.agency_name.str.lower()
-        .str.strip()
-        .str.replace(r"dept\.?", "department", regex=True)
-        .str.replace(r"\bco\.", "county", regex=True)
+    df.loc[:, "agency_name"] = canonicalize_agency_names(
+        df.agency_name, rule_set="mn"
     )
     return df[~(df.agency_name.fillna("") == "")]
 
@@ -1,8 +1,10 @@
-import io
 import os
+import sys
+from pathlib import Path
 
-import pandas as pd
-import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "common"))
+from downloader import download_states, print_summary, write_report
 
 
 # Dictionary of states with their respective Dropbox links
@@ -38,25 +40,15 @@ output_dir = "data"
 # Create the directory if it doesn't exist
 os.makedirs(output_dir, exist_ok=True)
 
-# Download and save the CSV files
-for state, url in state_links.items():
-    state_dir = os.path.join(output_dir, state)
-    os.makedirs(state_dir, exist_ok=True)
-    file_path = os.path.join(state_dir, f"{state}_index.csv")
-
-    # Check if the file already exists
-    if os.path.exists(file_path):
-        print(f"{file_path} already exists. Skipping download.")
-        continue
-
-    # Download the file if it doesn't exist
-    response = requests.get(url)
-    response.raise_for_status()  # Ensure the download was successful
-
-    # Read the CSV file into a pandas DataFrame
-    csv_data = pd.read_csv(io.StringIO(response.text))
-
-    # Save the DataFrame to a CSV file
-    csv_data.to_csv(file_path, index=False)
-
-    print(f"Saved {state} data to {file_path}")
+# Download the CSV files that are new or changed since the last run,
+# streamed straight to disk a few at a time
+results = download_states(
+    state_links,
+    lambda state: os.path.join(output_dir, state, f"{state}_index.csv"),
+    os.path.join(output_dir, "download-cache.json"),
+    workers=int(os.environ.get("DOWNLOAD_WORKERS", 4)),
+    validate=bool(os.environ.get("VALIDATE")),
+    force=bool(os.environ.get("FORCE")),
+)
+print_summary(results)
+write_report(results, os.path.join(output_dir, "download-report.json"))